@@ -21,6 +21,9 @@ from app.utils.timer import TimerUtils
 from .javranking import JavRanking
 
 from .javmenu import JavMenuWeb
+from .historystore import HistoryStore
+from .webpager import crawl_pages
+from .webclient import web_client
 
 class JavCrawler(_PluginBase):
     # 插件名称
@@ -52,6 +55,8 @@ class JavCrawler(_PluginBase):
     _scheduler: Optional[BackgroundScheduler] = None
     # Mysql连接
     _cnx = None
+    # 抓取记录，只保留最近的部分
+    _crawl_history: HistoryStore = None
 
     # 配置属性
     _enabled: bool = False
@@ -64,12 +69,16 @@ class JavCrawler(_PluginBase):
     _mysql_password: str = ""
     _rank_list: list = []
     _ignore_list = None
+    # 排行榜抓取的页数
+    _rank_pages: int = 1
     _start_time: int = None
     _end_time: int = None
 
     def init_plugin(self, config: dict = None):
         self.event = EventManager()
         self.javmenu = JavMenuWeb()
+        self._crawl_history = HistoryStore(self, "crawl_history", max_size=500, page_size=50, id_key=None)
+        self._crawl_history.migrate("crawl_history", newest_first=True)
 
         # 停止现有任务
         self.stop_service()
@@ -86,6 +95,7 @@ class JavCrawler(_PluginBase):
             self._mysql_password = config.get("mysql_password")
             self._rank_list = config.get("rank_list") or []
             self._ignore_list = config.get("ignore_list")
+            self._rank_pages = int(config.get("rank_pages")) if config.get("rank_pages") else 1
 
             # 保存配置
             self.__update_config()
@@ -129,6 +139,7 @@ class JavCrawler(_PluginBase):
                 "mysql_password": self._mysql_password,
                 "rank_list": self._rank_list,
                 "ignore_list": self._ignore_list,
+                "rank_pages": self._rank_pages,
             }
         )
 
@@ -362,6 +373,23 @@ class JavCrawler(_PluginBase):
                                     }
                                 ]
                             },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'rank_pages',
+                                            'label': '排行榜页数',
+                                            'placeholder': '每个排行榜抓取的页数，默认1页'
+                                        }
+                                    }
+                                ]
+                            },
                             {
                                 'component': 'VCol',
                                 'props': {
@@ -461,6 +489,7 @@ class JavCrawler(_PluginBase):
             "onlyonce": False,
             "rank_list": [self.rank_list_javmenu_censored_day, self.rank_list_javmenu_censored_week, self.rank_list_javmenu_censored_month],
             "ignore_list": "",
+            "rank_pages": 1,
             "mysql_host": "",
             "mysql_port": "",
             "mysql_username": "",
@@ -471,7 +500,7 @@ class JavCrawler(_PluginBase):
         """
         拼装插件详情页面，需要返回页面配置，同时附带数据
         """
-        crawl_data = self.get_data("crawl_history")
+        crawl_data = self._crawl_history.page(0)
         if crawl_data:
             contents = [
                 {
@@ -609,9 +638,11 @@ class JavCrawler(_PluginBase):
         source = "JavMenu{}{}".format("有码" if rank_type == "censored" else "无码", "日榜" if period == "day" else ("周榜" if period == "week" else "月榜"))
         logger.info("[JavCrawler][javmenu]开始抓取{} ...".format(source))
 
-        ret = self.javmenu.rank_list(type=rank_type, rank_type=period, page=1)
-
-        javlist = ret['jav_list']
+        javlist = crawl_pages(lambda page: self.javmenu.rank_list(type=rank_type, rank_type=period, page=page),
+                              self._rank_pages)
+        # 多页合并后重新计算排名
+        for ranking, jav in enumerate(javlist):
+            jav['ranking'] = ranking + 1
         logger.info("[JavCrawler][javmenu]{}抓取完成，共 {} 条数据".format(source, len(javlist)))
         logger.info("[JavCrawler][javmenu]开始写入数据库 ...")
         today = datetime.today()
@@ -657,17 +688,11 @@ class JavCrawler(_PluginBase):
         return date_object 
 
     def __add_crawl_history(self, time:datetime, source, info):
-        history_data = self.get_data("crawl_history")
-        history = []
-        if history_data is not None:
-            history = history_data
-        history.append({
+        self._crawl_history.append([{
             "time": time.strftime("%Y-%m-%d %H:%M"),
             "source": source,
             "info": info
-        })
-        history = sorted(history, key=lambda x: x["time"], reverse=True)
-        self.save_data("crawl_history", history)
+        }])
 
     def stop_service(self):
         """
@@ -679,5 +704,7 @@ class JavCrawler(_PluginBase):
                 if self._scheduler.running:
                     self._scheduler.shutdown()
                 self._scheduler = None
+            # 释放网络请求的线程池
+            web_client.shutdown()
         except Exception as e:
             logger.error("退出插件失败：%s" % str(e))
\ No newline at end of file
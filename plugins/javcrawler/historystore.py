@@ -0,0 +1,140 @@
+import math
+from typing import List, Optional, Set
+
+
+class HistoryStore:
+    """
+    有界历史记录存储
+    明细按固定大小分页循环保存，超过保留条数时覆盖最旧的分页，追加时只重写最新一页
+    另存一份只含ID的索引用于去重
+    """
+
+    def __init__(self, plugin, key: str, max_size: int = 2000, page_size: int = 100,
+                 id_key: Optional[str] = "id", max_ids: int = 50000):
+        """
+        :param plugin: 插件实例，通过 get_data/save_data 读写
+        :param key: 存储键名前缀
+        :param max_size: 明细最多保留条数
+        :param page_size: 每页条数
+        :param id_key: 记录中ID字段名，为空时不建立ID索引
+        :param max_ids: ID索引最多保留条数
+        """
+        self._plugin = plugin
+        self._key = key
+        self._page_size = page_size
+        self._max_pages = max(math.ceil(max_size / page_size), 1)
+        self._id_key = id_key
+        self._max_ids = max_ids
+        self._meta: Optional[dict] = None
+        self._tail: Optional[List[dict]] = None
+        self._ids: Optional[dict] = None
+
+    @property
+    def page_size(self) -> int:
+        return self._page_size
+
+    def __page_key(self, no: int) -> str:
+        return f"{self._key}_page_{no % self._max_pages}"
+
+    def __load(self):
+        if self._meta is not None:
+            return
+        self._meta = self._plugin.get_data(f"{self._key}_meta") or {"first": 0, "last": 0, "count": 0}
+        self._tail = self._plugin.get_data(self.__page_key(self._meta["last"])) or []
+        if self._id_key:
+            self._ids = dict.fromkeys(self._plugin.get_data(f"{self._key}_ids") or [])
+
+    def __len__(self):
+        self.__load()
+        return self._meta["count"]
+
+    def ids(self) -> Set[str]:
+        """
+        已记录的ID
+        """
+        self.__load()
+        return set(self._ids or [])
+
+    def append(self, records: List[dict]):
+        """
+        追加记录，只保存最新一页、ID索引及元数据
+        """
+        if not records:
+            return
+        self.__load()
+        meta = self._meta
+        for record in records:
+            if len(self._tail) >= self._page_size:
+                self._plugin.save_data(self.__page_key(meta["last"]), self._tail)
+                meta["last"] += 1
+                self._tail = []
+                if meta["last"] - meta["first"] >= self._max_pages:
+                    # 覆盖最旧的一页
+                    meta["first"] += 1
+                    meta["count"] -= self._page_size
+            self._tail.append(record)
+            meta["count"] += 1
+            if self._id_key and record.get(self._id_key):
+                self._ids.pop(record[self._id_key], None)
+                self._ids[record[self._id_key]] = None
+        if self._id_key:
+            while len(self._ids) > self._max_ids:
+                self._ids.pop(next(iter(self._ids)))
+            self._plugin.save_data(f"{self._key}_ids", list(self._ids))
+        self._plugin.save_data(self.__page_key(meta["last"]), self._tail)
+        self._plugin.save_data(f"{self._key}_meta", meta)
+
+    def page(self, no: int = 0) -> List[dict]:
+        """
+        分页读取明细，最新的记录在前
+        :param no: 页码，从0开始，0为最新一页
+        """
+        self.__load()
+        meta = self._meta
+        records = []
+        page_no = meta["last"]
+        # 最新一页可能不满，从最新页开始拼出完整的一页
+        skip = no * self._page_size
+        while page_no >= meta["first"] and len(records) < self._page_size:
+            items = self._tail if page_no == meta["last"] \
+                else (self._plugin.get_data(self.__page_key(page_no)) or [])
+            items = items[::-1]
+            if skip >= len(items):
+                skip -= len(items)
+            else:
+                records.extend(items[skip:skip + self._page_size - len(records)])
+                skip = 0
+            page_no -= 1
+        return records
+
+    def clear(self):
+        """
+        清空历史记录
+        """
+        self.__load()
+        for no in range(self._meta["first"], self._meta["last"] + 1):
+            self._plugin.save_data(self.__page_key(no), [])
+        self._meta = {"first": 0, "last": 0, "count": 0}
+        self._tail = []
+        self._ids = {} if self._id_key else None
+        self._plugin.save_data(f"{self._key}_meta", self._meta)
+        if self._id_key:
+            self._plugin.save_data(f"{self._key}_ids", [])
+
+    def migrate(self, legacy_key: str, newest_first: bool = False):
+        """
+        迁移旧版整体保存的历史记录，迁移后清空旧数据
+        :param legacy_key: 旧版存储键名
+        :param newest_first: 旧数据是否按最新在前排序
+        """
+        legacy = self._plugin.get_data(legacy_key)
+        if not legacy:
+            return
+        if newest_first:
+            legacy = legacy[::-1]
+        self.__load()
+        if self._id_key:
+            # 超出明细保留条数的旧记录只保留ID
+            self._ids.update(dict.fromkeys(item.get(self._id_key) for item in legacy if item.get(self._id_key)))
+        self.append(legacy[-self._max_pages * self._page_size:])
+        self._plugin.save_data(legacy_key, [])
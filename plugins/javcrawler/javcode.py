@@ -0,0 +1,55 @@
+import re
+from functools import lru_cache
+from typing import Optional
+
+# 识别前去除的干扰词
+_NOISE_RE = re.compile(r"SIS001|1080P|720P|2160P")
+
+# 番号规则，按优先级排列：(规则名, 正则, 番号所在分组)
+_CODE_PATTERNS = [
+    ("t28", r"T28[\-_]\d{3,4}", None),
+    # 一本道
+    ("pondo", r"1PONDO[\-_](\d{6}[\-_]\d{2,4})", 1),
+    ("heyzo", r"HEYZO[\-_]?\d{4}", None),
+    # 加勒比
+    ("carib", r"CARIB[\-_](\d{6}[\-_]\d{3})", 1),
+    # 东京热
+    ("tokyohot", r"N[-_]\d{4}", None),
+    # Jukujo-Club | 熟女俱乐部
+    ("jukujo", r"JUKUJO[-_]\d{4}", None),
+    # 通用
+    ("common", r"[A-Z]{2,5}[-_]\d{3,5}", None),
+    ("date", r"\d{6}[\-_]\d{2,4}", None),
+]
+
+# 所有规则合并为一个正则，零宽断言保证每个位置都会尝试匹配，一次扫描即可找出各规则最左侧的匹配
+_CODE_RE = re.compile("(?=" + "|".join(f"(?P<{name}>{pattern})" for name, pattern, _ in _CODE_PATTERNS) + ")")
+_CODE_PRIORITY = {name: (index, group) for index, (name, _, group) in enumerate(_CODE_PATTERNS)}
+
+
+@lru_cache(maxsize=65536)
+def is_jav(title: str) -> Optional[str]:
+    """
+    从标题中识别番号，未识别到时返回None
+    """
+    if not title:
+        return None
+    if title.endswith('/'):
+        title = title[:-1]
+    else:
+        title = title[title.rfind('/') + 1:]
+    title = _NOISE_RE.sub("", title.upper())
+    best = None
+    for match in _CODE_RE.finditer(title):
+        priority, group = _CODE_PRIORITY[match.lastgroup]
+        if best is None or priority < best[0]:
+            best = (priority, match, group)
+            if priority == 0:
+                break
+    if not best:
+        return None
+    _, match, group = best
+    code = match.group(match.lastgroup)
+    if group:
+        code = match.group(match.re.groupindex[match.lastgroup] + group)
+    return code.replace("_", "-")
@@ -2,8 +2,11 @@ import datetime
 import re
 import shutil
 import threading
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, Future, TimeoutError as FutureTimeoutError
 from enum import Enum
+from functools import partial
 from pathlib import Path
 from typing import List, Tuple, Dict, Any, Optional
 
@@ -35,8 +38,15 @@ from .javlib import JavlibWeb
 from .javmenu import JavMenuWeb
 from .javfiletransfer import JavFileTransferModule
 from .javscraper import JavScraper
-
-lock = threading.Lock()
+from .javdownload import downloader
+from .webclient import web_client
+from .javlock import PathLock
+from .javqueue import DebounceQueue
+from .javcache import JavMetaCache
+from .javcode import is_jav
+from .javsnapshot import DirSnapshot
+from .javhistory import TransferHistoryIndex
+from .javfilter import PathFilter
 
 
 class JavMediaType(Enum):
@@ -60,6 +70,9 @@ class FileMonitorHandler(FileSystemEventHandler):
         self.sync.event_handler(event=event, text="移动",
                                 mon_path=self._watch_path, event_path=event.dest_path)
 
+    def on_modified(self, event):
+        self.sync.event_modified(event=event, event_path=event.src_path)
+
 
 class JavDirMonitor(_PluginBase):
     # 插件名称
@@ -94,6 +107,7 @@ class JavDirMonitor(_PluginBase):
     _notify = False
     _onlyonce = False
     _cron = None
+    _clear_cache = False
     _scrap_metadata = True
     # 模式 compatibility/fast
     _mode = "fast"
@@ -101,10 +115,38 @@ class JavDirMonitor(_PluginBase):
     _transfer_type = settings.TRANSFER_TYPE
     _monitor_dirs = ""
     _exclude_keywords = ""
+    # 文件过滤器
+    _path_filter: Optional[PathFilter] = None
     DEFAULT_RENAME_FORMAT = "{{actor}}/{{year}} {{title}}/{{code}}{% if cn_subtitle %}{{cn_subtitle}}{% endif %}{{fileExt}}"
     _rename_format = ""
     _onlyonce_path = ""
     _interval: int = 10
+    # 并发处理文件数
+    _max_workers: int = 4
+    # 文件处理线程池
+    _executor: Optional[ThreadPoolExecutor] = None
+    # 文件静默时间（秒），文件停止变化后才处理
+    _quiet_period: float = 3
+    # 文件事件防抖队列
+    _event_queue: Optional[DebounceQueue] = None
+    # Jav元数据缓存
+    _meta_cache: Optional[JavMetaCache] = None
+    # 监控目录快照，全量同步时只处理新增或变化的文件
+    _snapshot: Optional[DirSnapshot] = None
+    # 转移历史索引，批量查询文件是否已处理过
+    _history: Optional[TransferHistoryIndex] = None
+    # 元数据查询线程池，各数据源并发查询
+    _fetch_executor: Optional[ThreadPoolExecutor] = None
+    # 各数据源查询截止时间（秒），超时后不再等待
+    _source_deadlines = {
+        "Javbus": 30,
+        "JavMenu": 15,
+        "Javlib": 15,
+    }
+    # 源文件路径锁，同一文件不会被同时处理
+    _src_lock = PathLock()
+    # 入库消息汇总锁
+    _medias_lock = threading.Lock()
     # 存储源目录与目的目录关系
     _dirconf: Dict[str, Optional[Path]] = {}
     # 存储源目录转移方式
@@ -115,6 +157,7 @@ class JavDirMonitor(_PluginBase):
 
     def init_plugin(self, config: dict = None):
         self.transferhis = TransferHistoryOper()
+        self._history = TransferHistoryIndex(self.transferhis)
         self.downloadhis = DownloadHistoryOper()
         self.transferchian = TransferChain()
         self.tmdbchain = TmdbChain()
@@ -122,7 +165,11 @@ class JavDirMonitor(_PluginBase):
         self.javlib = JavlibWeb()
         self.javmenu = JavMenuWeb()
         self.jav_file_transfer = JavFileTransferModule()
-        self.jav_scraper = JavScraper()
+        self.jav_scraper = JavScraper(cache_path=self.get_data_path() / "images")
+        if not self._meta_cache:
+            self._meta_cache = JavMetaCache(path=self.get_data_path() / "metadata.db")
+        if not self._snapshot:
+            self._snapshot = DirSnapshot(path=self.get_data_path())
         # 清空配置
         self._dirconf = {}
         self._transferconf = {}
@@ -137,15 +184,47 @@ class JavDirMonitor(_PluginBase):
             self._monitor_dirs = config.get("monitor_dirs") or ""
             self._exclude_keywords = config.get("exclude_keywords") or ""
             self._interval = config.get("interval") or 10
+            try:
+                self._max_workers = max(int(config.get("max_workers") or 4), 1)
+            except ValueError:
+                self._max_workers = 4
+            try:
+                self._quiet_period = max(float(config.get("quiet_period") or 3), 0)
+            except ValueError:
+                self._quiet_period = 3
             self._cron = config.get("cron")
             self._scrap_metadata = config.get("scrap_metadata")
             self._rename_format = config.get("rename_format") or self.DEFAULT_RENAME_FORMAT
             self._onlyonce_path = config.get("onlyonce_path") or ""
+            self._clear_cache = config.get("clear_cache")
+
+        # 构建文件过滤器
+        self._path_filter = None
+        self.__get_path_filter()
 
         # 停止现有任务
         self.stop_service()
 
+        # 清理元数据缓存及目录快照
+        if self._clear_cache:
+            self._meta_cache.invalidate()
+            self._snapshot.clear()
+            self.jav_scraper.clear_cache()
+            logger.info("Jav元数据缓存、图片缓存及目录快照已清理")
+            self._clear_cache = False
+            self.__update_config()
+
         if self._enabled or self._onlyonce:
+            # 文件处理线程池
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                                thread_name_prefix="JavDirMonitor")
+            self._fetch_executor = ThreadPoolExecutor(max_workers=self._max_workers * len(self._source_deadlines),
+                                                      thread_name_prefix="JavDirMonitor-fetch")
+            # 文件事件防抖队列
+            if self._enabled:
+                self._event_queue = DebounceQueue(callback=self.__dispatch_files,
+                                                  quiet=self._quiet_period)
+                self._event_queue.start()
             # 定时服务管理器
             self._scheduler = BackgroundScheduler(timezone=settings.TZ)
             # 追加入库消息统一发送服务
@@ -231,7 +310,7 @@ class JavDirMonitor(_PluginBase):
             if self._onlyonce:
                 if len(self._onlyonce_path) == 0:
                     logger.info("目录监控服务启动，立即运行一次")
-                    self._scheduler.add_job(func=self.sync_all, trigger='date',
+                    self._scheduler.add_job(func=self.sync_all, trigger='date', kwargs={"full": True},
                                             run_date=datetime.datetime.now(
                                                 tz=pytz.timezone(settings.TZ)) + datetime.timedelta(seconds=3)
                                             )
@@ -278,10 +357,13 @@ class JavDirMonitor(_PluginBase):
             "monitor_dirs": self._monitor_dirs,
             "exclude_keywords": self._exclude_keywords,
             "interval": self._interval,
+            "max_workers": self._max_workers,
+            "quiet_period": self._quiet_period,
             "cron": self._cron,
             "scrap_metadata": self._scrap_metadata,
             "rename_format": self._rename_format,
             "onlyonce_path": self._onlyonce_path,
+            "clear_cache": self._clear_cache,
         })
 
     @eventmanager.register(EventType.PluginAction)
@@ -296,21 +378,101 @@ class JavDirMonitor(_PluginBase):
             self.post_message(channel=event.event_data.get("channel"),
                               title="开始同步监控目录 ...",
                               userid=event.event_data.get("user"))
-        self.sync_all()
+        self.sync_all(full=True)
         if event:
             self.post_message(channel=event.event_data.get("channel"),
                               title="监控目录同步完成！", userid=event.event_data.get("user"))
 
-    def sync_all(self):
+    @eventmanager.register(EventType.PluginAction)
+    def remote_regenerate_nfo(self, event: Event):
+        """
+        远程批量重新生成NFO
+        """
+        if event:
+            event_data = event.event_data
+            if not event_data or event_data.get("action") != "nfo_regenerate":
+                return
+            self.post_message(channel=event.event_data.get("channel"),
+                              title="开始重新生成NFO ...",
+                              userid=event.event_data.get("user"))
+        self.__run_job(self.regenerate_nfo, name="批量重新生成NFO", event=event)
+
+    def __run_job(self, func, name: str, **kwargs):
+        """
+        耗时任务放到定时服务中执行，定时服务未启动时在后台线程中执行
+        """
+        if self._scheduler and self._scheduler.running:
+            self._scheduler.add_job(func=func, trigger='date', kwargs=kwargs, name=name,
+                                    run_date=datetime.datetime.now(
+                                        tz=pytz.timezone(settings.TZ)) + datetime.timedelta(seconds=3))
+        else:
+            threading.Thread(target=func, kwargs=kwargs, name=name, daemon=True).start()
+
+    def regenerate_nfo(self, event: Event = None) -> int:
+        """
+        批量重新生成所有本地媒体库目录中的NFO文件，每个文件识别后立即写入
+        :param event: 远程命令事件，完成后发送通知
+        :return: 生成的NFO数量
+        """
+        logger.info("开始批量重新生成NFO ...")
+        count = 0
+        targets = {}
+        for mon_path, target in self._dirconf.items():
+            transfer_type = self._transferconf.get(mon_path)
+            if not target or transfer_type in ['rclone_copy', 'rclone_move']:
+                continue
+            targets.setdefault(target, transfer_type)
+        for target, transfer_type in targets.items():
+            if not target.exists():
+                continue
+            for file_path in SystemUtils.list_files(target, settings.RMT_MEDIAEXT):
+                try:
+                    _, mediainfo = self.__recognize_media(file_path)
+                except Exception as e:
+                    logger.error(f"{file_path} 识别失败：{str(e)}")
+                    continue
+                if mediainfo and self.jav_scraper.gen_nfo_file(mediainfo, file_path, transfer_type=transfer_type):
+                    count += 1
+        logger.info(f"批量重新生成NFO完成，共 {count} 个")
+        if event:
+            self.post_message(channel=event.event_data.get("channel"),
+                              title=f"NFO重新生成完成，共 {count} 个！", userid=event.event_data.get("user"))
+        return count
+
+    def sync_all(self, full: bool = False):
         """
         立即运行一次，全量同步目录中所有文件
+        :param full: 是否忽略目录快照，重新检查所有文件，手动同步时使用
         """
         logger.info("开始全量同步监控目录 ...")
+        # 监控目录 -> (当前目录状态, 新增或变化的文件)
+        diffs: Dict[str, Tuple[Dict[str, list], List[str]]] = {}
         # 遍历所有监控目录
         for mon_path in self._dirconf.keys():
-            # 遍历目录下所有文件
-            for file_path in SystemUtils.list_files(Path(mon_path), settings.RMT_MEDIAEXT):
-                self.__handle_file(event_path=str(file_path), mon_path=mon_path)
+            # 与快照对比，只处理新增或变化的文件
+            changed, current = self._snapshot.diff(mon_path, settings.RMT_MEDIAEXT)
+            if full:
+                changed = list(current.keys())
+            logger.info(f"{mon_path} 共 {len(current)} 个媒体文件，其中 {len(changed)} 个需要检查")
+            diffs[mon_path] = (current, changed)
+        # 所有目录一次批量查询转移历史
+        batch = self._history.prefetch([file_path for _, changed in diffs.values() for file_path in changed])
+        # 监控目录 -> (当前目录状态, {文件路径: Future})
+        scans: Dict[str, Tuple[Dict[str, list], Dict[str, Optional[Future]]]] = {}
+        for mon_path, (current, changed) in diffs.items():
+            futures = {}
+            for file_path in changed:
+                futures[file_path] = self.__submit_file(event_path=file_path, mon_path=mon_path)
+            scans[mon_path] = (current, futures)
+        # 等待所有文件处理完成
+        wait([future for _, futures in scans.values() for future in futures.values() if future])
+        self._history.release(batch)
+        # 更新快照，未处理完毕的文件下次重新处理
+        for mon_path, (current, futures) in scans.items():
+            for file_path, future in futures.items():
+                if not future or future.cancelled() or future.exception() or not future.result():
+                    current.pop(file_path, None)
+            self._snapshot.replace(mon_path, current)
         logger.info("全量同步监控目录完成！")
         
     def sync_onlyonce_path(self):
@@ -346,14 +508,120 @@ class JavDirMonitor(_PluginBase):
         if not event.is_directory:
             # 文件发生变化
             logger.debug("文件%s：%s" % (text, event_path))
-            self.__handle_file(event_path=event_path, mon_path=mon_path)
+            if self._event_queue:
+                # 合并同一文件的事件，文件停止变化后再处理
+                self._event_queue.put(event_path, mon_path)
+            else:
+                self.__submit_file(event_path=event_path, mon_path=mon_path)
+
+    def event_modified(self, event, event_path: str):
+        """
+        文件内容变化，等待处理的文件重新计时
+        :param event: 事件
+        :param event_path: 事件文件路径
+        """
+        if not event.is_directory and self._event_queue:
+            self._event_queue.touch(event_path)
+
+    def __dispatch_files(self, files: List[Tuple[str, str]]):
+        """
+        防抖队列回调，分发已停止变化的文件
+        :param files: [(文件路径, 监控目录)]
+        """
+        batch = self._history.prefetch([event_path for event_path, _ in files])
+        futures = [self.__submit_file(event_path=event_path, mon_path=mon_path) for event_path, mon_path in files]
+        # 本批文件处理完毕后释放批量查询结果
+        self._history.release_after(batch, futures)
+
+    def __submit_file(self, event_path: str, mon_path: str):
+        """
+        提交文件到线程池处理，线程池未启动时直接处理
+        :param event_path: 事件文件路径
+        :param mon_path: 监控目录
+        :return: Future
+        """
+        if not self._executor:
+            future = Future()
+            future.set_result(self.__handle_file(event_path=event_path, mon_path=mon_path))
+            return future
+        try:
+            return self._executor.submit(self.__handle_file, event_path=event_path, mon_path=mon_path)
+        except RuntimeError:
+            # 线程池已关闭
+            logger.debug(f"目录监控已停止，不处理：{event_path}")
+            return None
+
+    def __get_cached_detail(self, source: str, id: str, fetch, field: str = None):
+        """
+        优先从缓存获取数据源详情，未命中时查询并写入缓存
+        :param source: 数据源
+        :param id: 番号
+        :param fetch: 查询方法，返回详情字典或None
+        :param field: 必须有值的字段，为空时视为未查询到
+        """
+        info = self._meta_cache.get(source, id) if self._meta_cache else None
+        if info is not None:
+            logger.debug(f"【{source}】{id} 命中元数据缓存")
+            # 空字典为否定缓存
+            return info or None
+        # 查询出错不写入缓存，下次重新查询
+        info = fetch(id)
+        if not info or (field and not info.get(field)):
+            info = {}
+        if self._meta_cache:
+            self._meta_cache.set(source, id, info)
+        return info or None
+
+    def __submit_detail(self, source: str, id: str, fetch, field: str = None) -> Future:
+        """
+        提交数据源详情查询，线程池未启动时直接查询
+        """
+        if self._fetch_executor:
+            try:
+                return self._fetch_executor.submit(self.__get_cached_detail, source, id, fetch, field)
+            except RuntimeError:
+                # 线程池已关闭
+                pass
+        future = Future()
+        try:
+            future.set_result(self.__get_cached_detail(source, id, fetch, field))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __wait_detail(self, source: str, id: str, future: Future, start: float, required: bool = False):
+        """
+        等待数据源查询结果，超过截止时间或查询出错时返回None
+        :param required: 是否必需的数据源，为True时超时及错误直接抛出
+        """
+        remaining = start + self._source_deadlines.get(source, 15) - time.monotonic()
+        try:
+            return future.result(timeout=max(remaining, 0))
+        except FutureTimeoutError:
+            logger.warn(f"【{source}】{id} 查询超时")
+            if required:
+                raise
+        except Exception as e:
+            logger.warn(f"【{source}】{id} 查询失败：{str(e)}")
+            if required:
+                raise
+        return None
 
     def __get_jav_detail(self, id):
         """
-        根据jav ID返回jav详情，带休眠
+        根据jav ID返回jav详情，三个数据源并发查询
         """
-            
-        jav_info = self.javbus.detail(id)
+        start = time.monotonic()
+        logger.info("正在并发查询Javbus、JavMenu、Javlib的Jav详情：%s" % id)
+        # 整理只需要元数据，不查询磁力链接
+        javbus_future = self.__submit_detail("Javbus", id, partial(self.javbus.detail, magnets=False), field="title")
+        javmenu_future = self.__submit_detail("JavMenu", id, self.javmenu.detail, field="img")
+        javlib_future = self.__submit_detail("Javlib", id, self.javlib.detail_by_javid)
+
+        jav_info = self.__wait_detail("Javbus", id, javbus_future, start, required=True)
+        if not jav_info:
+            logger.warn("【Javbus】%s 未找到Jav详细信息" % id)
+            return None
 
         jav_info['date'] = (jav_info.get('date', None) or '').replace('-', '.')
         jav_info['backdrop_img'] = jav_info.get('img', None) or ''
@@ -361,22 +629,15 @@ class JavDirMonitor(_PluginBase):
         if jav_info.get('img'):
             jav_info['post_img'] = (jav_info.get('img') or '').replace('cover', 'thumb').replace('_b.jpg', '.jpg')
             
-        if not jav_info:
-            logger.warn("【Javbus】%s 未找到Jav详细信息" % id)
-            return None
-        if not jav_info.get("title"):
-            logger.warn("【Javbus】%s 未找到Jav详细信息" % id)
-            return None
         logger.info("【Javbus】查询到数据：%s" % jav_info.get("title"))
         
         # 获取封面图
-        javmenu_info = self.javmenu.detail(id)
+        javmenu_info = self.__wait_detail("JavMenu", id, javmenu_future, start) or {}
         jav_info['backdrop_img'] = javmenu_info.get('img', None) or ''
         jav_info['post_img'] = javmenu_info.get('img', None) or ''
         
-        # 去javlib获取评分
-        logger.info("【Javlib】正在通过Javlib API查询Jav详情：%s" % id)
-        javlib_info = self.javlib.detail_by_javid(id)
+        # 去javlib获取评分，超时则不等待
+        javlib_info = self.__wait_detail("Javlib", id, javlib_future, start)
         if javlib_info:
             logger.info("【Javlib】查询到数据：%s, 评分：%s" % (javlib_info.get("id"), str(javlib_info.get('rating'))))
             jav_info['rating'] = javlib_info.get('rating')
@@ -433,52 +694,55 @@ class JavDirMonitor(_PluginBase):
         return file_meta, mediainfo
         
         
+    def __get_path_filter(self) -> PathFilter:
+        """
+        获取文件过滤器，整理屏蔽词变化时重新构建
+        """
+        exclude_words = tuple(word for word in self.systemconfig.get(SystemConfigKey.TransferExcludeWords) or []
+                              if word)
+        path_filter = self._path_filter
+        if not path_filter or path_filter.exclude_words != exclude_words:
+            path_filter = PathFilter(keywords=self._exclude_keywords.split("\n"),
+                                     exclude_words=list(exclude_words))
+            self._path_filter = path_filter
+        return path_filter
+
     def __handle_file(self, event_path: str, mon_path: str):
         """
         同步一个文件
         :param event_path: 事件文件路径
         :param mon_path: 监控目录
+        :return: 文件是否已处理完毕，为False时下次全量同步需重新处理
         """
         file_path = Path(event_path)
         try:
             if not file_path.exists():
-                return
-            # 全程加锁
-            with lock:
-                transfer_history = self.transferhis.get_by_src(event_path)
-                if transfer_history:
+                return True
+            # 同一文件加锁，正在处理中的文件不重复处理
+            with self._src_lock.hold(event_path, blocking=False) as acquired:
+                if not acquired:
+                    logger.debug("文件正在处理中：%s" % event_path)
+                    return False
+                if self._history.exists(event_path):
                     logger.debug("文件已处理过：%s" % event_path)
-                    return
-
-                # 回收站及隐藏的文件不处理
-                if event_path.find('/@Recycle/') != -1 \
-                        or event_path.find('/#recycle/') != -1 \
-                        or event_path.find('/.') != -1 \
-                        or event_path.find('/@eaDir') != -1:
-                    logger.debug(f"{event_path} 是回收站或隐藏的文件")
-                    return
-
-                # 命中过滤关键字不处理
-                if self._exclude_keywords:
-                    for keyword in self._exclude_keywords.split("\n"):
-                        if keyword and re.findall(keyword, event_path):
-                            logger.info(f"{event_path} 命中过滤关键字 {keyword}，不处理")
-                            return
-
-                # 整理屏蔽词不处理
-                transfer_exclude_words = self.systemconfig.get(SystemConfigKey.TransferExcludeWords)
-                if transfer_exclude_words:
-                    for keyword in transfer_exclude_words:
-                        if not keyword:
-                            continue
-                        if keyword and re.search(r"%s" % keyword, event_path, re.IGNORECASE):
-                            logger.info(f"{event_path} 命中整理屏蔽词 {keyword}，不处理")
-                            return
+                    return True
+
+                # 回收站及隐藏的文件、命中过滤关键字及整理屏蔽词的不处理
+                matched = self.__get_path_filter().match(event_path)
+                if matched:
+                    kind, keyword = matched
+                    if kind == PathFilter.KEYWORD:
+                        logger.info(f"{event_path} 命中过滤关键字 {keyword}，不处理")
+                    elif kind == PathFilter.EXCLUDE_WORD:
+                        logger.info(f"{event_path} 命中整理屏蔽词 {keyword}，不处理")
+                    else:
+                        logger.debug(f"{event_path} 是回收站或隐藏的文件")
+                    return True
 
                 # 不是媒体文件不处理
                 if file_path.suffix not in settings.RMT_MEDIAEXT:
                     logger.debug(f"{event_path} 不是媒体文件")
-                    return
+                    return True
 
                 # 判断是不是蓝光目录
                 if re.search(r"BDMV[/\\]STREAM", event_path, re.IGNORECASE):
@@ -486,12 +750,7 @@ class JavDirMonitor(_PluginBase):
                     # event_path = event_path[:event_path.find("BDMV")]
                     # file_path = Path(event_path)
                     logger.info(f"{event_path} 蓝光，不处理")
-                    return
-
-                # 查询历史记录，已转移的不处理
-                if self.transferhis.get_by_src(event_path):
-                    logger.info(f"{event_path} 已整理过")
-                    return
+                    return True
 
                 # 查询转移目的目录
                 target: Path = self._dirconf.get(mon_path)
@@ -503,7 +762,7 @@ class JavDirMonitor(_PluginBase):
                 file_meta, mediainfo = self.__recognize_media(file_path)
                 if not file_meta:
                     logger.debug(f"{event_path} 不是jav文件")
-                    return
+                    return True
                 
                 if not mediainfo:
                     logger.warn(f'未识别到媒体信息，番号：{file_meta.doubanid}')
@@ -518,7 +777,7 @@ class JavDirMonitor(_PluginBase):
                             mtype=NotificationType.Manual,
                             title=f"{file_path.name} 未识别到媒体信息，无法入库！"
                         ))
-                    return
+                    return True
                 
                 logger.info(f"{file_path.name} 识别为：{mediainfo.type.value} {mediainfo.title_year}")
 
@@ -537,7 +796,7 @@ class JavDirMonitor(_PluginBase):
 
                 if not transferinfo:
                     logger.error("文件转移模块运行失败")
-                    return
+                    return False
                 if not transferinfo.success:
                     # 转移失败
                     logger.warn(f"{file_path.name} 入库失败：{transferinfo.message}")
@@ -557,7 +816,7 @@ class JavDirMonitor(_PluginBase):
                             text=f"原因：{transferinfo.message or '未知'}",
                             image=mediainfo.get_message_image()
                         ))
-                    return
+                    return True
 
                 # 新增转移成功历史记录
                 self.transferhis.add_success(
@@ -576,48 +835,11 @@ class JavDirMonitor(_PluginBase):
                                                     transfer_type=transfer_type)
 
                 # 发送消息汇总
-                media_list = self._medias.get(mediainfo.title_year + " " + file_meta.season) or {}
-                if media_list:
-                    media_files = media_list.get("files") or []
-                    if media_files:
-                        file_exists = False
-                        for file in media_files:
-                            if str(event_path) == file.get("path"):
-                                file_exists = True
-                                break
-                        if not file_exists:
-                            media_files.append({
-                                "path": event_path,
-                                "mediainfo": mediainfo,
-                                "file_meta": file_meta,
-                                "transferinfo": transferinfo
-                            })
-                    else:
-                        media_files = [
-                            {
-                                "path": event_path,
-                                "mediainfo": mediainfo,
-                                "file_meta": file_meta,
-                                "transferinfo": transferinfo
-                            }
-                        ]
-                    media_list = {
-                        "files": media_files,
-                        "time": datetime.datetime.now()
-                    }
-                else:
-                    media_list = {
-                        "files": [
-                            {
-                                "path": event_path,
-                                "mediainfo": mediainfo,
-                                "file_meta": file_meta,
-                                "transferinfo": transferinfo
-                            }
-                        ],
-                        "time": datetime.datetime.now()
-                    }
-                self._medias[mediainfo.title_year + " " + file_meta.season] = media_list
+                with self._medias_lock:
+                    self.__append_media(event_path=event_path,
+                                        file_meta=file_meta,
+                                        mediainfo=mediainfo,
+                                        transferinfo=transferinfo)
 
                 # 广播事件
                 self.eventmanager.send_event(EventType.TransferComplete, {
@@ -636,9 +858,59 @@ class JavDirMonitor(_PluginBase):
                         if not files:
                             logger.warn(f"移动模式，删除空目录：{file_dir}")
                             shutil.rmtree(file_dir, ignore_errors=True)
+                return True
 
         except Exception as e:
             logger.error("目录监控发生错误：%s - %s" % (str(e), traceback.format_exc()))
+            return False
+
+    def __append_media(self, event_path: str, file_meta: MetaBase, mediainfo: MediaInfo,
+                       transferinfo: TransferInfo):
+        """
+        追加入库消息汇总
+        """
+        media_list = self._medias.get(mediainfo.title_year + " " + file_meta.season) or {}
+        if media_list:
+            media_files = media_list.get("files") or []
+            if media_files:
+                file_exists = False
+                for file in media_files:
+                    if str(event_path) == file.get("path"):
+                        file_exists = True
+                        break
+                if not file_exists:
+                    media_files.append({
+                        "path": event_path,
+                        "mediainfo": mediainfo,
+                        "file_meta": file_meta,
+                        "transferinfo": transferinfo
+                    })
+            else:
+                media_files = [
+                    {
+                        "path": event_path,
+                        "mediainfo": mediainfo,
+                        "file_meta": file_meta,
+                        "transferinfo": transferinfo
+                    }
+                ]
+            media_list = {
+                "files": media_files,
+                "time": datetime.datetime.now()
+            }
+        else:
+            media_list = {
+                "files": [
+                    {
+                        "path": event_path,
+                        "mediainfo": mediainfo,
+                        "file_meta": file_meta,
+                        "transferinfo": transferinfo
+                    }
+                ],
+                "time": datetime.datetime.now()
+            }
+        self._medias[mediainfo.title_year + " " + file_meta.season] = media_list
 
     def send_msg(self):
         """
@@ -701,7 +973,8 @@ class JavDirMonitor(_PluginBase):
                                                              transferinfo=transferinfo,
                                                              season_episode=season_episode)
                 # 发送完消息，移出key
-                del self._medias[medis_title_year_season]
+                with self._medias_lock:
+                    self._medias.pop(medis_title_year_season, None)
                 continue
 
     def get_download_hash(self, src: str):
@@ -730,6 +1003,14 @@ class JavDirMonitor(_PluginBase):
             "data": {
                 "action": "directory_sync"
             }
+        }, {
+            "cmd": "/jav_nfo_regenerate",
+            "event": EventType.PluginAction,
+            "desc": "重新生成Jav NFO",
+            "category": "管理",
+            "data": {
+                "action": "nfo_regenerate"
+            }
         }]
 
     def get_api(self) -> List[Dict[str, Any]]:
@@ -739,15 +1020,28 @@ class JavDirMonitor(_PluginBase):
             "methods": ["GET"],
             "summary": "目录监控同步",
             "description": "目录监控同步",
+        }, {
+            "path": "/nfo_regenerate",
+            "endpoint": self.nfo_regenerate,
+            "methods": ["GET"],
+            "summary": "重新生成NFO",
+            "description": "批量重新生成媒体库目录中的NFO文件",
         }]
 
     def sync(self) -> schemas.Response:
         """
         API调用目录同步
         """
-        self.sync_all()
+        self.sync_all(full=True)
         return schemas.Response(success=True)
 
+    def nfo_regenerate(self) -> schemas.Response:
+        """
+        API调用批量重新生成NFO，任务在后台执行
+        """
+        self.__run_job(self.regenerate_nfo, name="批量重新生成NFO")
+        return schemas.Response(success=True, message="已开始重新生成NFO")
+
     def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
         return [
             {
@@ -829,7 +1123,7 @@ class JavDirMonitor(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 4
+                                    'md': 3
                                 },
                                 'content': [
                                     {
@@ -849,7 +1143,7 @@ class JavDirMonitor(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 4
+                                    'md': 3
                                 },
                                 'content': [
                                     {
@@ -873,7 +1167,7 @@ class JavDirMonitor(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 4
+                                    'md': 3
                                 },
                                 'content': [
                                     {
@@ -885,6 +1179,23 @@ class JavDirMonitor(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'max_workers',
+                                            'label': '并发处理数',
+                                            'placeholder': '4'
+                                        }
+                                    }
+                                ]
                             }
                         ]
                     },
@@ -894,7 +1205,8 @@ class JavDirMonitor(_PluginBase):
                             {
                                 'component': 'VCol',
                                 'props': {
-                                    'cols': 12
+                                    'cols': 12,
+                                    'md': 6
                                 },
                                 'content': [
                                     {
@@ -906,6 +1218,23 @@ class JavDirMonitor(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'quiet_period',
+                                            'label': '文件静默时间',
+                                            'placeholder': '文件停止变化多少秒后才整理，默认3'
+                                        }
+                                    }
+                                ]
                             }
                         ]
                     },
@@ -1001,6 +1330,27 @@ class JavDirMonitor(_PluginBase):
                             }
                         ]
                     },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'clear_cache',
+                                            'label': '清理缓存及目录快照',
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
                     {
                         'component': 'VRow',
                         'content': [
@@ -1015,7 +1365,7 @@ class JavDirMonitor(_PluginBase):
                                         'props': {
                                             'type': 'info',
                                             'variant': 'tonal',
-                                            'text': '入库消息延迟默认10s，如网络较慢可酌情调大，有助于发送统一入库消息。'
+                                            'text': '入库消息延迟默认10s，如网络较慢可酌情调大，有助于发送统一入库消息。并发处理数为同时识别转移的文件数量，默认4。'
                                         }
                                     }
                                 ]
@@ -1033,10 +1383,13 @@ class JavDirMonitor(_PluginBase):
             "monitor_dirs": "",
             "exclude_keywords": "",
             "interval": 10,
+            "max_workers": 4,
+            "quiet_period": 3,
             "cron": "",
             "scrap_metadata": False,
             "rename_format": self.DEFAULT_RENAME_FORMAT,
             "onlyonce_path": "",
+            "clear_cache": False,
         }
 
     def get_page(self) -> List[dict]:
@@ -1054,6 +1407,15 @@ class JavDirMonitor(_PluginBase):
                 except Exception as e:
                     print(str(e))
         self._observer = []
+        if self._event_queue:
+            self._event_queue.stop()
+            self._event_queue = None
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._fetch_executor:
+            self._fetch_executor.shutdown(wait=False, cancel_futures=True)
+            self._fetch_executor = None
         if self._scheduler:
             self._scheduler.remove_all_jobs()
             if self._scheduler.running:
@@ -1061,58 +1423,12 @@ class JavDirMonitor(_PluginBase):
                 self._scheduler.shutdown()
                 self._event.clear()
             self._scheduler = None
+        # 释放网络请求及图片下载的线程池
+        web_client.shutdown()
+        downloader.shutdown()
 
     def is_jav(self, title):
-        if not title:
-            return None
-        if title.endswith('/'):
-            title = title[:-1]
-        else:
-            title = title[title.rfind('/')+1:]
-        title = title.upper().replace("SIS001", "").replace("1080P", "").replace("720P", "").replace("2160P", "")
-        t = re.search(r'T28[\-_]\d{3,4}', title)
-        # 一本道
-        if not t:
-            t = re.search(r'1PONDO[\-_]\d{6}[\-_]\d{2,4}', title)
-            if t:
-                t = t.group().replace("1PONDO_", "").replace("1PONDO-", "")
-        if not t:
-            t = re.search(r'HEYZO[\-_]?\d{4}', title)
-        if not t:
-            # 加勒比
-            t = re.search(r'CARIB[\-_]\d{6}[\-_]\d{3}' ,title)
-            if t:
-                t = t.group().replace("CARIB-", "").replace("CARIB_", "")
-        if not t:
-            # 东京热
-            t = re.search(r'N[-_]\d{4}' ,title)
-        
-        if not t:
-            # Jukujo-Club | 熟女俱乐部
-            t = re.search(r'JUKUJO[-_]\d{4}' ,title)
-
-        # 通用
-        # if not t:
-        #     t = re.search(r'S[A-Z]{1,4}[-_]\d{3,5}' ,title)
-        if not t:
-            t = re.search(r'[A-Z]{2,5}[-_]\d{3,5}' ,title)
-        if not t:
-            t = re.search(r'\d{6}[\-_]\d{2,4}' ,title)
-
-        # if not t:
-        #     t = re.search(r'[A-Z]+\d{3,5}' ,title)
-        
-        # if not t:
-        #     t = re.search(r'[A-Za-z]+[-_]?\d+' ,title)
-        
-        # if not t:
-        #     t = re.search(r'\d+[-_]?\d+' ,title)
-            
-        if not t:
-            return None
-        else:
-            t = t.group().replace("_", "-")
-            return t
+        return is_jav(title)
         
     def is_jav_chinese(self, title):
         return '字幕' in title or '中文' in title or '-c' in title or '-C' in title or '-UC' in title
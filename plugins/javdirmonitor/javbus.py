@@ -1,13 +1,10 @@
 from app.utils.singleton import Singleton
 from app.core.config import settings
-from app.utils.http import RequestUtils
-from lxml import etree
+from .webparser import compile_parsers, parse_html, get_list, get_obj
+from .webclient import web_client
 import re
-import requests
 
 class JavbusWeb(object):
-    _session = requests.Session()
-
     global _web_base
     _web_base = "https://www.javbus.com"
     _page_limit = 50
@@ -28,7 +25,7 @@ class JavbusWeb(object):
         "actor_medias": f"{_web_base}/star/%s/%s"
     }
 
-    _webparsers = {
+    _webparsers = compile_parsers({
         "search_pagination": {
             "list": '//ul[@class="pagination pagination-lg"]',
             "item": {
@@ -138,7 +135,7 @@ class JavbusWeb(object):
                 "img": lambda x : None if not x else _web_base + x
             }
         }
-    }
+    })
     
     @classmethod
     def __invoke_web(cls, url, params=(), cookies='', headers={}):
@@ -148,11 +145,11 @@ class JavbusWeb(object):
         if "user-agent" not in headers:
             headers['accept-language'] = 'zh-CN,zh;q=0.9,en;q=0.8,en-US;q=0.7'
             headers['user-agent'] = 'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/102.0.0.0 Safari/537.36'
-        return RequestUtils(cookies=cookies,
-                            session=cls._session,
-                            headers=headers,
-                            proxies=cls._proxies,
-                            timeout=cls._timout).get(url=req_url % params)
+        return web_client.get(req_url % params,
+                              cookies=cookies,
+                              headers=headers,
+                              proxies=cls._proxies,
+                              timeout=cls._timout)
 
     @classmethod
     def __invoke_json(cls, url, *kwargs):
@@ -162,10 +159,10 @@ class JavbusWeb(object):
         headers = {}
         headers['accept-language'] = 'zh-CN,zh;q=0.9,en;q=0.8,en-US;q=0.7'
         headers['user-agent'] = 'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/102.0.0.0 Safari/537.36'
-        req = RequestUtils(session=cls._session,
-                            headers=headers,
-                            proxies=cls._proxies,
-                           timeout=cls._timout).get_res(url=req_url % kwargs)
+        req = web_client.get_res(req_url % kwargs,
+                                 headers=headers,
+                                 proxies=cls._proxies,
+                                 timeout=cls._timout)
         return req.json() if req else None
 
     @staticmethod
@@ -176,64 +173,22 @@ class JavbusWeb(object):
 
     @classmethod
     def __get_list(cls, url, html):
-        if not url or not html:
-            return None
-        xpaths = cls._webparsers.get(url)
-        if not xpaths:
+        if not url:
             return None
-        items = etree.HTML(html).xpath(xpaths.get("list"))
-        if not items:
-            return None
-        result = []
-        for item in items:
-            obj = {}
-            for key, value in xpaths.get("item").items():
-                format = lambda x:x
-                if xpaths.get("format") and xpaths.get("format").get(key):
-                    format = xpaths.get("format").get(key)
-                default = None
-                if isinstance(value, list):
-                    default = value[1]
-                    value = value[0]
-                if isinstance(value, str):
-                    text = item.xpath(value)
-                    if text:
-                        obj[key] = format(text) if len(text) > 1 else format(text[0])
-                    else:
-                        obj[key] = default
-            if obj:
-                result.append(obj)
-        return result
+        return get_list(cls._webparsers.get(url), parse_html(html))
 
     @classmethod
     def __get_obj(cls, url, html):
-        if not url or not html:
-            return None
-        xpaths = cls._webparsers.get(url)
-        if not xpaths:
+        if not url:
             return None
-        obj = {}
-        for key, value in xpaths.items():
-            try:
-                format = lambda x:x
-                if isinstance(value, list) and len(value) == 2:
-                    format = value[1]
-                    value = value[0]
-                text = etree.HTML(html).xpath(value)
-                text = text[0] if text and len(text) == 1 else text
-                if len(text) == 0: text = None
-                obj[key] = format(text)
-            except Exception as e:
-                pass
-                # ExceptionUtils.exception_traceback(e)
-        return obj
+        return get_obj(cls._webparsers.get(url), parse_html(html))
 
     @classmethod
     def search(cls, keyword, page=1, magnet='all', type='normal'):
         """
         关键字查询
         """
-        doc = cls.__invoke_web("search", cookies="existmag={}".format('mag' if magnet=='all' else 'all'), params=('search' if type=='normal' else 'uncensored', keyword, page))
+        doc = parse_html(cls.__invoke_web("search", cookies="existmag={}".format('mag' if magnet=='all' else 'all'), params=('search' if type=='normal' else 'uncensored', keyword, page)))
         movies = cls.__get_list("search_movies", doc)
         pagination = cls.__get_list('search_pagination', doc)
         return {'movies': movies if movies else [], 'pagination': pagination, "keyword": keyword}
@@ -242,11 +197,13 @@ class JavbusWeb(object):
         return self.detail(code)
     
     @classmethod
-    def detail(cls, id):
+    def detail(cls, id, magnets=True):
         """
         影片详情
+        :param magnets: 是否查询磁力链接，为False时不请求磁力接口，magnets为空列表
         """
-        doc = cls.__invoke_web("detail", params=(id))
+        html = cls.__invoke_web("detail", params=(id))
+        doc = parse_html(html)
         info = cls.__get_obj("detail_info", doc)
         info['score'] = 0.0
         info['director'] = cls.__get_obj("directorInfo", doc)
@@ -257,12 +214,16 @@ class JavbusWeb(object):
         info['stars'] = cls.__get_list("stars", doc)
         info['samples'] = cls.__get_list("samples", doc)
         info['related'] = cls.__get_list("related", doc)
+        if not magnets:
+            info['magnets'] = []
+            info['magnet'] = None
+            return info
         gidReg = "var gid = (\d+);"
         ucReg = "var uc = (\d+);"
-        gid = re.search(gidReg, doc)
+        gid = re.search(gidReg, html)
         gid = gid.group(1) if gid else None
         
-        uc = re.search(ucReg, doc)
+        uc = re.search(ucReg, html)
         uc = uc.group(1) if uc else None
         
         magnets_html = cls.__invoke_web("magnets", headers={'referer': _web_base+'/'+id}, params=(gid,uc))
@@ -296,7 +257,7 @@ class JavbusWeb(object):
         """
         演员参与作品
         """
-        doc = cls.__invoke_web("actor_medias", cookies="existmag={}".format('mag' if magnet=='all' else 'all'), params=(aid, page))
+        doc = parse_html(cls.__invoke_web("actor_medias", cookies="existmag={}".format('mag' if magnet=='all' else 'all'), params=(aid, page)))
         movies = cls.__get_list("search_movies", doc)
         pagination = cls.__get_list('search_pagination', doc)
         return {'movies': movies if movies else [], 'pagination': pagination, "actor_id": aid}
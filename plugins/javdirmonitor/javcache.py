@@ -0,0 +1,116 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from app.log import logger
+
+
+class JavMetaCache:
+    """
+    Jav元数据缓存，按 数据源+番号 持久化到本地，超过有效期或数量上限时淘汰最久未使用的记录
+    未查询到数据时写入空字典作为否定缓存，有效期较短
+    """
+
+    def __init__(self, path: Path, ttl: int = 7 * 24 * 3600, max_size: int = 5000,
+                 negative_ttl: int = 6 * 3600):
+        """
+        :param path: 缓存数据库文件路径
+        :param ttl: 有效期（秒）
+        :param max_size: 最大缓存条数
+        :param negative_ttl: 否定缓存有效期（秒）
+        """
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta ("
+                               "source TEXT NOT NULL, "
+                               "code TEXT NOT NULL, "
+                               "data TEXT NOT NULL, "
+                               "created REAL NOT NULL, "
+                               "accessed REAL NOT NULL, "
+                               "PRIMARY KEY (source, code))")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_meta_accessed ON meta (accessed)")
+
+    @staticmethod
+    def normalize(code: str) -> str:
+        """
+        番号标准化
+        """
+        return (code or "").strip().upper().replace("_", "-")
+
+    def get(self, source: str, code: str) -> Optional[dict]:
+        """
+        查询缓存，过期的记录会被删除
+        :param source: 数据源
+        :param code: 番号
+        :return: 未缓存时返回None，否定缓存返回空字典
+        """
+        code = self.normalize(code)
+        if not code:
+            return None
+        now = time.time()
+        try:
+            with self._lock, self._conn:
+                row = self._conn.execute("SELECT data, created FROM meta WHERE source = ? AND code = ?",
+                                         (source, code)).fetchone()
+                if not row:
+                    return None
+                data = json.loads(row[0])
+                if row[1] + (self._ttl if data else self._negative_ttl) < now:
+                    self._conn.execute("DELETE FROM meta WHERE source = ? AND code = ?", (source, code))
+                    return None
+                self._conn.execute("UPDATE meta SET accessed = ? WHERE source = ? AND code = ?",
+                                   (now, source, code))
+            return data
+        except Exception as e:
+            logger.warn(f"读取元数据缓存失败：{str(e)}")
+            return None
+
+    def set(self, source: str, code: str, data: dict):
+        """
+        写入缓存，超过数量上限时淘汰最久未使用的记录
+        :param source: 数据源
+        :param code: 番号
+        :param data: 元数据，为空字典时写入否定缓存
+        """
+        code = self.normalize(code)
+        if not code or data is None:
+            return
+        now = time.time()
+        try:
+            with self._lock, self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO meta (source, code, data, created, accessed) "
+                                   "VALUES (?, ?, ?, ?, ?)",
+                                   (source, code, json.dumps(data, ensure_ascii=False, default=str), now, now))
+                count = self._conn.execute("SELECT COUNT(*) FROM meta").fetchone()[0]
+                if count > self._max_size:
+                    self._conn.execute("DELETE FROM meta WHERE rowid IN "
+                                       "(SELECT rowid FROM meta ORDER BY accessed LIMIT ?)",
+                                       (count - self._max_size,))
+        except Exception as e:
+            logger.warn(f"写入元数据缓存失败：{str(e)}")
+
+    def invalidate(self, code: str = None):
+        """
+        删除缓存
+        :param code: 番号，为空时清空全部缓存
+        """
+        with self._lock, self._conn:
+            if code:
+                self._conn.execute("DELETE FROM meta WHERE code = ?", (self.normalize(code),))
+            else:
+                self._conn.execute("DELETE FROM meta")
+
+    def close(self):
+        """
+        关闭缓存
+        """
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,168 @@
+import errno
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+from app.log import logger
+
+# 单次复制的块大小
+CHUNK_SIZE = 16 * 1024 * 1024
+# 断点续传前校验的尾部长度
+VERIFY_SIZE = 1024 * 1024
+# 进度日志间隔（秒）
+PROGRESS_INTERVAL = 10
+
+
+def part_path(target_file: Path) -> Path:
+    """
+    复制过程中使用的临时文件路径
+    """
+    return target_file.with_name(f".{target_file.name}.part")
+
+
+def copy_file(file_item: Path, target_file: Path,
+              progress: Callable[[int, int, float], None] = None) -> Tuple[int, str]:
+    """
+    分块复制文件，先写入临时文件，同步到磁盘后再原子重命名为目标文件
+    临时文件存在时校验后断点续传
+    :param file_item: 文件路径
+    :param target_file: 目标文件路径
+    :param progress: 进度回调，参数为 (已复制字节数, 总字节数, 速度 字节/秒)
+    :return: 返回码，错误信息
+    """
+    temp_file = part_path(target_file)
+    try:
+        total = file_item.stat().st_size
+        offset = _resume_offset(file_item, temp_file, total)
+        if offset:
+            logger.info(f"{target_file} 从 {offset} 字节处继续复制")
+        with open(file_item, "rb") as fsrc, open(temp_file, "r+b" if offset else "wb") as fdst:
+            fdst.truncate(offset)
+            speed = _copy_range(fsrc, fdst, offset, total, file_item.name, progress)
+            fdst.flush()
+            os.fsync(fdst.fileno())
+        shutil.copystat(file_item, temp_file)
+        os.replace(temp_file, target_file)
+        _fsync_dir(target_file.parent)
+        logger.info(f"{file_item.name} 复制完成，平均速度 {speed / 1024 / 1024:.1f} MB/s")
+        return 0, ""
+    except Exception as err:
+        return 1, f"复制文件失败：{file_item} - {str(err)}"
+
+
+def move_file(file_item: Path, target_file: Path,
+              progress: Callable[[int, int, float], None] = None) -> Tuple[int, str]:
+    """
+    移动文件，同一文件系统内直接重命名，否则复制完成后删除原文件
+    :param file_item: 文件路径
+    :param target_file: 目标文件路径
+    :param progress: 进度回调
+    :return: 返回码，错误信息
+    """
+    try:
+        os.rename(file_item, target_file)
+        return 0, ""
+    except OSError as err:
+        # 只有跨文件系统时才改为复制后删除
+        if err.errno != errno.EXDEV:
+            return 1, f"移动文件失败：{file_item} - {str(err)}"
+    retcode, retmsg = copy_file(file_item, target_file, progress=progress)
+    if retcode != 0:
+        return retcode, retmsg
+    try:
+        file_item.unlink()
+    except Exception as err:
+        return 1, f"删除原文件失败：{file_item} - {str(err)}"
+    return 0, ""
+
+
+def _resume_offset(file_item: Path, temp_file: Path, total: int) -> int:
+    """
+    计算可续传的位置，临时文件尾部与原文件对应位置内容一致时才续传
+    """
+    if not temp_file.exists():
+        return 0
+    size = temp_file.stat().st_size
+    if size == 0 or size > total:
+        return 0
+    verify = min(size, VERIFY_SIZE)
+    with open(file_item, "rb") as fsrc, open(temp_file, "rb") as fdst:
+        fsrc.seek(size - verify)
+        fdst.seek(size - verify)
+        if fsrc.read(verify) != fdst.read(verify):
+            logger.info(f"临时文件 {temp_file} 与原文件不一致，重新复制")
+            return 0
+    return size
+
+
+def _copy_range(fsrc, fdst, offset: int, total: int, name: str,
+                progress: Optional[Callable[[int, int, float], None]]) -> float:
+    """
+    从offset处复制到文件末尾，优先使用内核零拷贝
+    :return: 平均速度（字节/秒）
+    """
+    start = time.monotonic()
+    last_report = start
+    copied = 0
+    src_fd = fsrc.fileno()
+    dst_fd = fdst.fileno()
+    method = "copy_file_range" if hasattr(os, "copy_file_range") else "sendfile"
+    buffer = None
+    while offset < total:
+        count = min(CHUNK_SIZE, total - offset)
+        sent = 0
+        # 部分FUSE及网络文件系统不支持内核复制时返回0而不报错，与出错一样改用下一种方式重试本块
+        if method == "copy_file_range":
+            try:
+                sent = os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+            except OSError:
+                sent = 0
+            if not sent:
+                method = "sendfile"
+        if method == "sendfile":
+            try:
+                os.lseek(dst_fd, offset, os.SEEK_SET)
+                sent = os.sendfile(dst_fd, src_fd, offset, count)
+            except (OSError, AttributeError):
+                sent = 0
+            if not sent:
+                method = "buffer"
+        if method == "buffer":
+            if buffer is None:
+                buffer = memoryview(bytearray(CHUNK_SIZE))
+            fsrc.seek(offset)
+            fdst.seek(offset)
+            sent = fsrc.readinto(buffer[:count])
+            fdst.write(buffer[:sent])
+        if not sent:
+            raise IOError(f"文件在复制过程中被截断，已复制 {offset}/{total} 字节")
+        offset += sent
+        copied += sent
+        now = time.monotonic()
+        if now - last_report >= PROGRESS_INTERVAL or offset >= total:
+            speed = copied / max(now - start, 1e-6)
+            if progress:
+                progress(offset, total, speed)
+            if now - last_report >= PROGRESS_INTERVAL:
+                logger.info(f"正在复制 {name}：{offset * 100 // max(total, 1)}%，"
+                            f"{speed / 1024 / 1024:.1f} MB/s")
+            last_report = now
+    return copied / max(time.monotonic() - start, 1e-6)
+
+
+def _fsync_dir(path: Path):
+    """
+    同步目录项到磁盘，保证重命名持久化
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
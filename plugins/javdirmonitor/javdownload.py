@@ -0,0 +1,128 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.utils.http import RequestUtils
+
+
+class TokenBucket:
+    """
+    令牌桶限速，允许短时突发，长期平均速率不超过rate
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        """
+        :param rate: 每秒生成的令牌数
+        :param capacity: 桶容量，即允许的突发请求数
+        """
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        获取一个令牌，令牌不足时等待
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+
+class ImageDownloader:
+    """
+    图片下载器，共用一个连接池，按站点限制并发及请求速率
+    线程池及连接池在首次使用时创建，插件停止时通过 shutdown 释放
+    """
+
+    def __init__(self, max_workers: int = 8, host_limit: int = 4,
+                 rate: float = 8, burst: int = 16, timeout: int = 30):
+        """
+        :param max_workers: 下载线程数
+        :param host_limit: 同一站点的并发数
+        :param rate: 同一站点每秒请求数
+        :param burst: 同一站点允许的突发请求数
+        :param timeout: 请求超时（秒）
+        """
+        self._host_limit = host_limit
+        self._rate = rate
+        self._burst = burst
+        self._timeout = timeout
+        self._max_workers = max_workers
+        self._session: Optional[requests.Session] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, tuple] = {}
+
+    def __start(self) -> Tuple[requests.Session, ThreadPoolExecutor]:
+        """
+        创建线程池及连接池，已创建时直接返回
+        """
+        with self._lock:
+            if not self._executor:
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self._max_workers, pool_maxsize=self._max_workers)
+                self._session.mount("http://", adapter)
+                self._session.mount("https://", adapter)
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                                    thread_name_prefix="JavImageDownloader")
+            return self._session, self._executor
+
+    def shutdown(self):
+        """
+        关闭线程池及连接池，未开始的下载任务被取消，之后再次使用时重新创建
+        """
+        with self._lock:
+            session, executor = self._session, self._executor
+            self._session = self._executor = None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if session:
+            session.close()
+
+    def __host(self, url: str) -> tuple:
+        """
+        获取站点的并发信号量及令牌桶
+        """
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = (threading.BoundedSemaphore(self._host_limit),
+                                     TokenBucket(rate=self._rate, capacity=self._burst))
+            return self._hosts[host]
+
+    def get(self, url: str) -> Optional[bytes]:
+        """
+        下载图片内容，请求异常时抛出RequestException
+        """
+        semaphore, bucket = self.__host(url)
+        session, _ = self.__start()
+        with semaphore:
+            bucket.acquire()
+            r = RequestUtils(session=session,
+                             timeout=self._timeout).get_res(url=url, raise_exception=True)
+        return r.content if r else None
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """
+        提交下载任务到下载线程池
+        """
+        _, executor = self.__start()
+        return executor.submit(fn, *args, **kwargs)
+
+
+# 所有刮削共用的图片下载器
+downloader = ImageDownloader()
@@ -1,6 +1,8 @@
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
-from threading import Lock
 from typing import Optional, List, Tuple, Union, Dict
 
 from jinja2 import Template
@@ -15,12 +17,29 @@ from app.schemas import TransferInfo, ExistMediaInfo, TmdbEpisode
 from app.schemas.types import MediaType
 from app.utils.string import StringUtils
 from app.utils.system import SystemUtils
+from .javlock import PathLock
+from .javcopy import copy_file, move_file
+from .javslots import TransferScheduler
 
-lock = Lock()
+# 转移调度，按转移方式及磁盘限制并发
+transfer_scheduler = TransferScheduler()
+# 目标路径锁，同一目标路径不会被同时转移
+target_lock = PathLock()
+
+
+@lru_cache(maxsize=32)
+def compile_template(template_string: str) -> Template:
+    """
+    编译重命名模板，同一格式只编译一次
+    """
+    return Template(template_string)
 
 
 class JavFileTransferModule(_ModuleBase):
-    
+
+    # 目录转移时并行转移的文件数
+    _dir_workers = 4
+
     def init_module(self) -> None:
         pass
 
@@ -126,25 +145,27 @@ class JavFileTransferModule(_ModuleBase):
                 rename_dict=self.__get_naming_dict(meta=in_meta,
                                                    mediainfo=mediainfo)
             ).parent
-            # 转移蓝光原盘
-            retcode = self.__transfer_dir(file_path=in_path,
-                                          new_path=new_path,
-                                          transfer_type=transfer_type)
-            if retcode != 0:
-                logger.error(f"文件夹 {in_path} 转移失败，错误码：{retcode}")
-                return TransferInfo(success=False,
-                                    message=f"错误码：{retcode}",
+            # 同一目标路径串行转移
+            with target_lock.hold(str(new_path)):
+                # 转移蓝光原盘
+                retcode = self.__transfer_dir(file_path=in_path,
+                                              new_path=new_path,
+                                              transfer_type=transfer_type)
+                if retcode != 0:
+                    logger.error(f"文件夹 {in_path} 转移失败，错误码：{retcode}")
+                    return TransferInfo(success=False,
+                                        message=f"错误码：{retcode}",
+                                        path=in_path,
+                                        target_path=new_path,
+                                        is_bluray=bluray_flag)
+
+                logger.info(f"文件夹 {in_path} 转移成功")
+                # 返回转移后的路径
+                return TransferInfo(success=True,
                                     path=in_path,
                                     target_path=new_path,
+                                    total_size=file_size,
                                     is_bluray=bluray_flag)
-
-            logger.info(f"文件夹 {in_path} 转移成功")
-            # 返回转移后的路径
-            return TransferInfo(success=True,
-                                path=in_path,
-                                target_path=new_path,
-                                total_size=file_size,
-                                is_bluray=bluray_flag)
         else:
             # 目的文件名
             new_file = self.get_rename_path(
@@ -157,64 +178,66 @@ class JavFileTransferModule(_ModuleBase):
                 )
             )
 
-            # 判断是否要覆盖
-            overflag = False
-            if new_file.exists():
-                # 目标文件已存在
-                OVERWRITE_MODE = 'size'
-                logger.info(f"目标文件已存在，转移覆盖模式：{OVERWRITE_MODE}")
-                match OVERWRITE_MODE:
-                    case 'always':
-                        # 总是覆盖同名文件
-                        overflag = True
-                    case 'size':
-                        # 存在时大覆盖小
-                        if new_file.stat().st_size < in_path.stat().st_size:
-                            logger.info(f"目标文件文件大小更小，将被覆盖：{new_file}")
+            # 同一目标文件串行转移
+            with target_lock.hold(str(new_file)):
+                # 判断是否要覆盖
+                overflag = False
+                if new_file.exists():
+                    # 目标文件已存在
+                    OVERWRITE_MODE = 'size'
+                    logger.info(f"目标文件已存在，转移覆盖模式：{OVERWRITE_MODE}")
+                    match OVERWRITE_MODE:
+                        case 'always':
+                            # 总是覆盖同名文件
                             overflag = True
-                        else:
+                        case 'size':
+                            # 存在时大覆盖小
+                            if new_file.stat().st_size < in_path.stat().st_size:
+                                logger.info(f"目标文件文件大小更小，将被覆盖：{new_file}")
+                                overflag = True
+                            else:
+                                return TransferInfo(success=False,
+                                                    message=f"媒体库中已存在，且质量更好",
+                                                    path=in_path,
+                                                    target_path=new_file,
+                                                    fail_list=[str(in_path)])
+                        case 'never':
+                            # 存在不覆盖
                             return TransferInfo(success=False,
-                                                message=f"媒体库中已存在，且质量更好",
+                                                message=f"媒体库中已存在，当前设置为不覆盖",
                                                 path=in_path,
                                                 target_path=new_file,
                                                 fail_list=[str(in_path)])
-                    case 'never':
-                        # 存在不覆盖
-                        return TransferInfo(success=False,
-                                            message=f"媒体库中已存在，当前设置为不覆盖",
-                                            path=in_path,
-                                            target_path=new_file,
-                                            fail_list=[str(in_path)])
-                    # case 'latest':
-                    #     # 仅保留最新版本
-                    #     self.delete_all_version_files(new_file)
-                    #     overflag = True
-                    case _:
-                        pass
-            # 原文件大小
-            file_size = in_path.stat().st_size
-            # 转移文件
-            retcode = self.__transfer_file(file_item=in_path,
-                                           new_file=new_file,
-                                           transfer_type=transfer_type,
-                                           over_flag=overflag)
-            if retcode != 0:
-                logger.error(f"文件 {in_path} 转移失败，错误码：{retcode}")
-                return TransferInfo(success=False,
-                                    message=f"错误码：{retcode}",
+                        # case 'latest':
+                        #     # 仅保留最新版本
+                        #     self.delete_all_version_files(new_file)
+                        #     overflag = True
+                        case _:
+                            pass
+                # 原文件大小
+                file_size = in_path.stat().st_size
+                # 转移文件
+                retcode = self.__transfer_file(file_item=in_path,
+                                               new_file=new_file,
+                                               transfer_type=transfer_type,
+                                               over_flag=overflag)
+                if retcode != 0:
+                    logger.error(f"文件 {in_path} 转移失败，错误码：{retcode}")
+                    return TransferInfo(success=False,
+                                        message=f"错误码：{retcode}",
+                                        path=in_path,
+                                        target_path=new_file,
+                                        fail_list=[str(in_path)])
+
+                logger.info(f"文件 {in_path} 转移成功")
+                return TransferInfo(success=True,
                                     path=in_path,
                                     target_path=new_file,
-                                    fail_list=[str(in_path)])
-
-            logger.info(f"文件 {in_path} 转移成功")
-            return TransferInfo(success=True,
-                                path=in_path,
-                                target_path=new_file,
-                                file_count=1,
-                                total_size=file_size,
-                                is_bluray=False,
-                                file_list=[str(in_path)],
-                                file_list_new=[str(new_file)])
+                                    file_count=1,
+                                    total_size=file_size,
+                                    is_bluray=False,
+                                    file_list=[str(in_path)],
+                                    file_list_new=[str(new_file)])
         
         
     @staticmethod
@@ -255,8 +278,8 @@ class JavFileTransferModule(_ModuleBase):
         """
         生成重命名后的完整路径
         """
-        # 创建jinja2模板对象
-        template = Template(template_string)
+        # 获取编译后的jinja2模板对象
+        template = compile_template(template_string)
         # 渲染生成的字符串
         render_str = template.render(rename_dict)
         # 目的路径
@@ -313,31 +336,66 @@ class JavFileTransferModule(_ModuleBase):
     
     def __transfer_dir_files(self, src_dir: Path, target_dir: Path, transfer_type: str) -> int:
         """
-        按目录结构转移目录下所有文件
+        按目录结构转移目录下所有文件，多个文件并行转移，全部完成后汇总结果
         :param src_dir: 原路径
         :param target_dir: 新路径
         :param transfer_type: RmtMode转移方式
+        :return: 全部成功时为0，否则为第一个失败文件的错误码
         """
-        retcode = 0
-        for file in src_dir.glob("**/*"):
-            # 过滤掉目录
-            if file.is_dir():
-                continue
-            # 使用target_dir的父目录作为新的父目录
-            new_file = target_dir.joinpath(file.relative_to(src_dir))
-            if new_file.exists():
+        # 遍历源目录
+        files: List[Tuple[Path, Path]] = []
+        stack = [str(src_dir)]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    # 不进入指向目录的符号链接，避免循环链接无限遍历
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    if entry.is_dir():
+                        continue
+                    file = Path(entry.path)
+                    files.append((file, target_dir.joinpath(file.relative_to(src_dir))))
+
+        # 目标目录只创建及列举一次
+        exists_files: Dict[Path, set] = {}
+        for parent in {new_file.parent for _, new_file in files}:
+            if parent.exists():
+                exists_files[parent] = set(os.listdir(parent))
+            else:
+                parent.mkdir(parents=True, exist_ok=True)
+                exists_files[parent] = set()
+        pending = []
+        for file, new_file in files:
+            if new_file.name in exists_files[new_file.parent]:
                 logger.warn(f"{new_file} 文件已存在")
                 continue
-            if not new_file.parent.exists():
-                new_file.parent.mkdir(parents=True, exist_ok=True)
-            retcode = self.__transfer_command(file_item=file,
-                                              target_file=new_file,
-                                              transfer_type=transfer_type)
-            if retcode != 0:
-                break
+            pending.append((file, new_file))
+        if not pending:
+            return 0
+
+        # 并行转移
+        results: Dict[Path, int] = {}
+        with ThreadPoolExecutor(max_workers=min(self._dir_workers, len(pending)),
+                                thread_name_prefix="JavFileTransfer") as executor:
+            futures = {executor.submit(self.__transfer_command,
+                                       file_item=file,
+                                       target_file=new_file,
+                                       transfer_type=transfer_type): file
+                       for file, new_file in pending}
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    logger.error(f"{futures[future]} 转移出错：{str(e)}")
+                    results[futures[future]] = 1
+
+        failed = [(file, retcode) for file, _ in pending if (retcode := results.get(file)) != 0]
+        for file, retcode in failed:
+            logger.error(f"{file} 转移失败，错误码：{retcode}")
+        logger.info(f"{src_dir} 共转移 {len(pending)} 个文件，成功 {len(pending) - len(failed)} 个，失败 {len(failed)} 个")
+        return failed[0][1] if failed else 0
 
-        return retcode
-    
     @staticmethod
     def __transfer_command(file_item: Path, target_file: Path, transfer_type: str) -> int:
         """
@@ -346,8 +404,7 @@ class JavFileTransferModule(_ModuleBase):
         :param target_file: 目标文件路径
         :param transfer_type: RmtMode转移方式
         """
-        with lock:
-
+        with transfer_scheduler.slot(file_item, target_file, transfer_type):
             # 转移
             if transfer_type == 'link':
                 # 硬链接
@@ -356,8 +413,8 @@ class JavFileTransferModule(_ModuleBase):
                 # 软链接
                 retcode, retmsg = SystemUtils.softlink(file_item, target_file)
             elif transfer_type == 'move':
-                # 移动
-                retcode, retmsg = SystemUtils.move(file_item, target_file)
+                # 移动，跨文件系统时分块复制后删除原文件
+                retcode, retmsg = move_file(file_item, target_file)
             elif transfer_type == 'rclone_move':
                 # Rclone 移动
                 retcode, retmsg = SystemUtils.rclone_move(file_item, target_file)
@@ -365,8 +422,8 @@ class JavFileTransferModule(_ModuleBase):
                 # Rclone 复制
                 retcode, retmsg = SystemUtils.rclone_copy(file_item, target_file)
             else:
-                # 复制
-                retcode, retmsg = SystemUtils.copy(file_item, target_file)
+                # 复制，分块写入临时文件后重命名，支持断点续传
+                retcode, retmsg = copy_file(file_item, target_file)
 
         if retcode != 0:
             logger.error(retmsg)
@@ -0,0 +1,72 @@
+import re
+from typing import List, Optional, Tuple
+
+from app.log import logger
+
+
+class PathFilter:
+    """
+    文件过滤器，回收站及隐藏目录、过滤关键字、整理屏蔽词合并为一个正则，每个文件只需匹配一次
+    含全局标志、命名分组、反向引用等无法合并的规则单独编译，合并失败时全部单独匹配
+    """
+
+    # 回收站及隐藏的文件
+    IGNORE = "ignore"
+    # 过滤关键字
+    KEYWORD = "keyword"
+    # 整理屏蔽词
+    EXCLUDE_WORD = "exclude_word"
+
+    _IGNORE_PATTERN = r"/@Recycle/|/#recycle/|/\.|/@eaDir"
+    # 合并后会改变含义或无法编译的写法：全局标志、命名分组、反向引用、条件分组
+    _UNCOMBINABLE_RE = re.compile(r"\(\?[aiLmsux]+\)|\(\?P[<=]|\\\d|\\g<|\(\?\(")
+
+    def __init__(self, keywords: List[str] = None, exclude_words: List[str] = None):
+        """
+        :param keywords: 过滤关键字，区分大小写
+        :param exclude_words: 整理屏蔽词，不区分大小写
+        """
+        self.keywords = tuple(keyword for keyword in keywords or [] if keyword)
+        self.exclude_words = tuple(word for word in exclude_words or [] if word)
+        # 分组名 -> (过滤类型, 关键字)
+        self._groups = {"g0": (self.IGNORE, None)}
+        patterns = [f"(?P<g0>{self._IGNORE_PATTERN})"]
+        # 单独匹配的规则：(正则, 过滤类型, 关键字)
+        self._separate: List[Tuple[re.Pattern, str, str]] = []
+        combinable = []
+        for kind, words, flags in ((self.KEYWORD, self.keywords, 0),
+                                   (self.EXCLUDE_WORD, self.exclude_words, re.IGNORECASE)):
+            for word in words:
+                try:
+                    pattern = re.compile(word, flags)
+                except re.error as e:
+                    logger.warn(f"过滤规则 {word} 不是有效的正则表达式：{str(e)}")
+                    continue
+                if self._UNCOMBINABLE_RE.search(word):
+                    self._separate.append((pattern, kind, word))
+                else:
+                    combinable.append((pattern, kind, word))
+        for pattern, kind, word in combinable:
+            name = f"g{len(self._groups)}"
+            self._groups[name] = (kind, word)
+            patterns.append(f"(?P<{name}>{'(?i:' + word + ')' if pattern.flags & re.IGNORECASE else word})")
+        try:
+            self._pattern = re.compile("|".join(patterns))
+        except re.error as e:
+            logger.warn(f"过滤规则无法合并，逐条匹配：{str(e)}")
+            self._groups = {"g0": (self.IGNORE, None)}
+            self._pattern = re.compile(patterns[0])
+            self._separate = combinable + self._separate
+
+    def match(self, path: str) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        匹配文件路径
+        :return: (过滤类型, 命中的关键字)，未命中时返回None
+        """
+        match = self._pattern.search(path)
+        if match:
+            return self._groups[match.lastgroup]
+        for pattern, kind, word in self._separate:
+            if pattern.search(path):
+                return kind, word
+        return None
@@ -0,0 +1,100 @@
+import threading
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional, Set
+
+from app.db import get_db
+from app.db.models.transferhistory import TransferHistory
+from app.db.transferhistory_oper import TransferHistoryOper
+from app.log import logger
+
+
+class TransferHistoryIndex:
+    """
+    转移历史索引，批量查询一批源文件是否已转移过
+    每个调用方的查询结果单独保存为一个批次，只信任已有转移历史的结果，每个路径使用一次后失效
+    未命中的路径单独查询数据库，数据库始终是转移历史的唯一依据
+    """
+
+    # 单次查询的路径数量，避免超出数据库参数个数限制
+    _chunk_size = 500
+
+    def __init__(self, transferhis: TransferHistoryOper):
+        self._transferhis = transferhis
+        self._lock = threading.Lock()
+        self._seq = 0
+        # 批次号 -> 该批已有转移历史的源路径
+        self._batches: Dict[int, Set[str]] = {}
+
+    def prefetch(self, paths: Iterable[str]) -> Optional[int]:
+        """
+        批量查询一批源路径的转移历史
+        :return: 批次号，处理完毕后需调用 release 释放，查询失败时返回None
+        """
+        paths = list(set(paths))
+        if not paths:
+            return None
+        found = set()
+        db_gen = get_db()
+        db = next(db_gen)
+        try:
+            for i in range(0, len(paths), self._chunk_size):
+                chunk = paths[i:i + self._chunk_size]
+                rows = db.query(TransferHistory.src).filter(TransferHistory.src.in_(chunk)).all()
+                found.update(row[0] for row in rows)
+        except Exception as e:
+            logger.warn(f"批量查询转移历史失败：{str(e)}")
+            return None
+        finally:
+            db_gen.close()
+        with self._lock:
+            self._seq += 1
+            self._batches[self._seq] = found
+            return self._seq
+
+    def release(self, batch: Optional[int]):
+        """
+        释放批次中未使用的查询结果
+        """
+        if batch is None:
+            return
+        with self._lock:
+            self._batches.pop(batch, None)
+
+    def release_after(self, batch: Optional[int], futures: List[Optional[Future]]):
+        """
+        一批文件全部处理完毕后释放批次
+        """
+        futures = [future for future in futures if future]
+        if batch is None or not futures:
+            self.release(batch)
+            return
+        pending = [len(futures)]
+        lock = threading.Lock()
+
+        def done(_):
+            with lock:
+                pending[0] -= 1
+                if pending[0]:
+                    return
+            self.release(batch)
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    def exists(self, path: str) -> bool:
+        """
+        源路径是否已有转移历史，批量查询未命中的路径单独查询
+        """
+        with self._lock:
+            for found in self._batches.values():
+                if path in found:
+                    found.discard(path)
+                    return True
+        return bool(self._transferhis.get_by_src(path))
+
+    def clear(self):
+        """
+        清空索引
+        """
+        with self._lock:
+            self._batches.clear()
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.log import logger
+
+
+class ImageCache:
+    """
+    图片内容缓存，按URL保存下载的原始图片，总大小超过上限时淘汰最久未使用的图片
+    """
+
+    def __init__(self, path: Path, max_size: int = 1024 * 1024 * 1024):
+        """
+        :param path: 缓存目录
+        :param max_size: 缓存总大小上限（字节）
+        """
+        self._path = path
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        # 缓存文件名 -> [大小, 最后使用时间]
+        self._index: Optional[Dict[str, List[float]]] = None
+        self._total = 0
+
+    @staticmethod
+    def __key(url: str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def __file(self, key: str) -> Path:
+        return self._path / key[:2] / key
+
+    def __load(self):
+        """
+        扫描缓存目录建立索引，调用方需持有锁
+        """
+        if self._index is not None:
+            return
+        self._index = {}
+        self._total = 0
+        if not self._path.exists():
+            return
+        for file in self._path.glob("*/*"):
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+            if file.suffix == ".tmp":
+                file.unlink(missing_ok=True)
+                continue
+            self._index[file.name] = [stat.st_size, stat.st_mtime]
+            self._total += stat.st_size
+
+    def get(self, url: str) -> Optional[bytes]:
+        """
+        读取缓存的图片内容，未缓存时返回None
+        """
+        key = self.__key(url)
+        with self._lock:
+            self.__load()
+            entry = self._index.get(key)
+            if not entry:
+                return None
+            entry[1] = time.time()
+        file = self.__file(key)
+        try:
+            content = file.read_bytes()
+            os.utime(file)
+            return content
+        except OSError:
+            with self._lock:
+                entry = self._index.pop(key, None)
+                if entry:
+                    self._total -= entry[0]
+            return None
+
+    def put(self, url: str, content: bytes):
+        """
+        写入缓存，超过大小上限时淘汰最久未使用的图片
+        """
+        if not content or len(content) > self._max_size:
+            return
+        key = self.__key(url)
+        file = self.__file(key)
+        try:
+            file.parent.mkdir(parents=True, exist_ok=True)
+            temp_file = file.with_name(f"{key}.{threading.get_ident()}.tmp")
+            temp_file.write_bytes(content)
+            temp_file.replace(file)
+        except OSError as e:
+            logger.warn(f"写入图片缓存失败：{url} - {str(e)}")
+            return
+        with self._lock:
+            self.__load()
+            entry = self._index.get(key)
+            if entry:
+                self._total -= entry[0]
+            self._index[key] = [len(content), time.time()]
+            self._total += len(content)
+            if self._total > self._max_size:
+                self.__evict()
+
+    def __evict(self):
+        """
+        淘汰最久未使用的图片，直到总大小降到上限的90%，调用方需持有锁
+        """
+        target = self._max_size * 0.9
+        for key, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total <= target:
+                break
+            self.__file(key).unlink(missing_ok=True)
+            del self._index[key]
+            self._total -= size
+
+    def clear(self):
+        """
+        清空缓存
+        """
+        with self._lock:
+            self.__load()
+            for key in list(self._index.keys()):
+                self.__file(key).unlink(missing_ok=True)
+            self._index = {}
+            self._total = 0
@@ -1,13 +1,10 @@
 from app.utils.singleton import Singleton
 from app.core.config import settings
-from app.utils.http import RequestUtils
-from lxml import etree
+from .webparser import compile_parsers, parse_html, get_list, get_obj
+from .webclient import web_client
 import re
-import requests
 
 class JavlibWeb(object):
-    _session = requests.Session()
-
     _web_base = "https://www.javlibrary.com/cn"
     _page_limit = 50
     _timout = 5
@@ -29,7 +26,7 @@ class JavlibWeb(object):
         "detail_info": f"{_web_base}/?v=%s",
     }
 
-    _webparsers = {
+    _webparsers = compile_parsers({
         "common_list": {
             "list": '//*[@class="video"]',
             "item": {
@@ -84,7 +81,7 @@ class JavlibWeb(object):
                 "starId": lambda a:None if not a else a[a.rfind('=')+1:],
             }
         }
-    }
+    })
     
     @classmethod
     def detail_by_javid(cls, jav_id):
@@ -93,7 +90,7 @@ class JavlibWeb(object):
         """
         if not jav_id: return None
         jav_id = jav_id.upper()
-        html = cls.__invoke_web("search", params=(jav_id, 1, 1))
+        html = parse_html(cls.__invoke_web("search", params=(jav_id, 1, 1)))
         list = cls.__get_list("common_list", html)
         if list and len(list) > 0:
             # 有多个结果，筛选第一个符合条件的
@@ -110,7 +107,7 @@ class JavlibWeb(object):
         """
         影片详情
         """
-        doc = cls.__invoke_web("detail_info", params=(vid))
+        doc = parse_html(cls.__invoke_web("detail_info", params=(vid)))
         info = cls.__get_obj("detail_info", doc)
         info['director'] = cls.__get_obj("directorInfo", doc)
         info['producer'] = cls.__get_obj("producerInfo", doc)
@@ -127,7 +124,7 @@ class JavlibWeb(object):
         """
         关键字查询
         """
-        html = cls.__invoke_web("search", params=(keyword, page, mode))
+        html = parse_html(cls.__invoke_web("search", params=(keyword, page, mode)))
         list = cls.__get_list("common_list", html)
         if list and len(list) > 0:
             return list
@@ -182,61 +179,19 @@ class JavlibWeb(object):
             return None
         if "user-agent" not in headers:
             headers['user-agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/102.0.0.0 Safari/537.36'
-        return RequestUtils(cookies=cookies,
-                            session=cls._session,
-                            headers=headers,
-                            proxies=cls._proxies,
-                            timeout=cls._timout).get(url=req_url % params)
+        return web_client.get(req_url % params,
+                              cookies=cookies,
+                              headers=headers,
+                              proxies=cls._proxies,
+                              timeout=cls._timout)
     @classmethod
     def __get_list(cls, url, html):
-        if not url or not html:
-            return None
-        xpaths = cls._webparsers.get(url)
-        if not xpaths:
+        if not url:
             return None
-        items = etree.HTML(html).xpath(xpaths.get("list"))
-        if not items:
-            return None
-        result = []
-        for item in items:
-            obj = {}
-            for key, value in xpaths.get("item").items():
-                format = lambda x:x
-                if xpaths.get("format") and xpaths.get("format").get(key):
-                    format = xpaths.get("format").get(key)
-                default = None
-                if isinstance(value, list):
-                    default = value[1]
-                    value = value[0]
-                if isinstance(value, str):
-                    text = item.xpath(value)
-                    if text:
-                        obj[key] = format(text) if len(text) > 1 else format(text[0])
-                    else:
-                        obj[key] = default
-            if obj:
-                result.append(obj)
-        return result
+        return get_list(cls._webparsers.get(url), parse_html(html))
 
     @classmethod
     def __get_obj(cls, url, html):
-        if not url or not html:
-            return None
-        xpaths = cls._webparsers.get(url)
-        if not xpaths:
+        if not url:
             return None
-        obj = {}
-        for key, value in xpaths.items():
-            try:
-                format = lambda x:x
-                if isinstance(value, list) and len(value) == 2:
-                    format = value[1]
-                    value = value[0]
-                text = etree.HTML(html).xpath(value)
-                text = text[0] if text and len(text) == 1 else text
-                if len(text) == 0: text = None
-                obj[key] = format(text)
-            except Exception as e:
-                # ExceptionUtils.exception_traceback(e)
-                pass
-        return obj
\ No newline at end of file
+        return get_obj(cls._webparsers.get(url), parse_html(html))
@@ -0,0 +1,45 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict, List
+
+
+class PathLock:
+    """
+    按路径加锁，同一路径串行处理，不同路径互不阻塞
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 路径 -> [锁, 引用计数]
+        self._locks: Dict[str, List] = {}
+
+    @contextmanager
+    def hold(self, key: str, blocking: bool = True):
+        """
+        获取路径锁
+        :param key: 路径
+        :param blocking: 是否等待，为False时路径已被占用则立即返回False
+        :return: 是否获取成功
+        """
+        key = str(key)
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        acquired = entry[0].acquire(blocking)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                entry[0].release()
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._locks.pop(key, None)
+
+    def locked(self, key: str) -> bool:
+        """
+        路径是否正在处理中
+        """
+        with self._lock:
+            entry = self._locks.get(str(key))
+            return bool(entry and entry[0].locked())
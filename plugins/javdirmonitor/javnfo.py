@@ -0,0 +1,93 @@
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, TextIO
+from xml.sax.saxutils import unescape
+
+
+def _escape(data: str) -> str:
+    """
+    与 minidom 一致的转义
+    """
+    return data.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+
+def read_element(file_path: Path, tag: str) -> Optional[str]:
+    """
+    读取已有NFO中第一个同名文本元素的值，文件不存在或无该元素时返回None
+    """
+    try:
+        content = file_path.read_text(encoding="utf-8", errors="ignore")
+    except OSError:
+        return None
+    match = re.search(rf"<{tag}>([^<]*)</{tag}>", content)
+    return unescape(match.group(1), {"&quot;": "\""}).strip() if match else None
+
+
+class NfoWriter:
+    """
+    流式NFO写入，逐个元素写入输出流，不在内存中构建DOM
+    输出与 minidom 的 toprettyxml(indent="  ", encoding="utf-8") 逐字节一致
+    """
+
+    def __init__(self, stream: TextIO, indent: str = "  ", newl: str = "\n"):
+        """
+        :param stream: 文本输出流
+        :param indent: 缩进
+        :param newl: 换行符
+        """
+        self._stream = stream
+        self._indent = indent
+        self._newl = newl
+        # 已打开的元素：[标签名, 是否已有子元素]
+        self._stack: List[list] = []
+        stream.write(f'<?xml version="1.0" encoding="utf-8"?>{newl}')
+
+    def __prefix(self) -> str:
+        """
+        写入新元素前关闭父元素的开始标签，返回当前缩进
+        """
+        if self._stack and not self._stack[-1][1]:
+            self._stream.write(">" + self._newl)
+            self._stack[-1][1] = True
+        return self._indent * len(self._stack)
+
+    def __open(self, tag: str, attrs: Optional[Dict[str, str]]):
+        self._stream.write(self.__prefix() + "<" + tag)
+        for name, value in (attrs or {}).items():
+            self._stream.write(f' {name}="{_escape(value)}"')
+
+    def start(self, tag: str, attrs: Dict[str, str] = None):
+        """
+        开始一个包含子元素的元素
+        """
+        self.__open(tag, attrs)
+        self._stack.append([tag, False])
+
+    def end(self):
+        """
+        结束最近开始的元素
+        """
+        tag, has_children = self._stack.pop()
+        if has_children:
+            self._stream.write(f"{self._indent * len(self._stack)}</{tag}>{self._newl}")
+        else:
+            self._stream.write("/>" + self._newl)
+
+    def element(self, tag: str, text: Optional[str] = None, attrs: Dict[str, str] = None):
+        """
+        写入一个文本元素，text为None时写入空元素
+        """
+        self.__open(tag, attrs)
+        if text is None:
+            self._stream.write("/>" + self._newl)
+        else:
+            self._stream.write(f">{_escape(str(text))}</{tag}>{self._newl}")
+
+    def cdata(self, tag: str, data: str):
+        """
+        写入一个CDATA元素
+        """
+        if data.find("]]>") >= 0:
+            raise ValueError("']]>' not allowed in a CDATA section")
+        self.__open(tag, None)
+        self._stream.write(f"><![CDATA[{data}]]></{tag}>{self._newl}")
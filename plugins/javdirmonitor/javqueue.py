@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.log import logger
+
+
+class DebounceQueue:
+    """
+    文件事件防抖队列
+    同一文件的多次事件合并为一条，文件在静默时间内大小和修改时间都不再变化后才分发处理
+    """
+
+    def __init__(self, callback: Callable[[List[Tuple[str, str]]], None], quiet: float = 3):
+        """
+        :param callback: 分发回调，参数为 [(文件路径, 监控目录)]
+        :param quiet: 静默时间（秒）
+        """
+        self._callback = callback
+        self._quiet = max(float(quiet), 0)
+        # 文件路径 -> [监控目录, 到期时间, 文件签名]
+        self._pending: Dict[str, list] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def start(self):
+        """
+        启动分发线程
+        """
+        if self._thread:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self.__run, name="JavDirMonitor-debounce", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        停止分发线程，丢弃未到期的事件
+        """
+        with self._cond:
+            self._stopped = True
+            self._pending.clear()
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def put(self, path: str, mon_path: str):
+        """
+        加入队列，已在队列中的文件重新计时
+        """
+        signature = self.__signature(path)
+        with self._cond:
+            self._pending[path] = [mon_path, time.monotonic() + self._quiet, signature]
+            self._cond.notify()
+
+    def touch(self, path: str):
+        """
+        文件仍在变化，已在队列中的文件重新计时
+        """
+        with self._cond:
+            entry = self._pending.get(path)
+            if entry:
+                entry[1] = time.monotonic() + self._quiet
+
+    def __len__(self):
+        with self._cond:
+            return len(self._pending)
+
+    @staticmethod
+    def __signature(path: str) -> Optional[Tuple[int, int]]:
+        """
+        文件签名：大小及修改时间
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def __run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    now = time.monotonic()
+                    due = [path for path, entry in self._pending.items() if entry[1] <= now]
+                    if due:
+                        break
+                    timeout = min((entry[1] for entry in self._pending.values()), default=None)
+                    self._cond.wait(timeout=None if timeout is None else timeout - now)
+                if self._stopped:
+                    return
+                due = [(path, self._pending.pop(path)) for path in due]
+
+            ready = []
+            for path, (mon_path, _, signature) in due:
+                current = self.__signature(path)
+                if current is None:
+                    # 文件已不存在
+                    continue
+                if current != signature:
+                    # 静默时间内文件仍有变化，重新计时
+                    with self._cond:
+                        if path not in self._pending:
+                            self._pending[path] = [mon_path, time.monotonic() + self._quiet, current]
+                    continue
+                ready.append((path, mon_path))
+
+            if ready:
+                try:
+                    self._callback(ready)
+                except Exception as e:
+                    logger.error(f"文件事件分发失败：{str(e)}")
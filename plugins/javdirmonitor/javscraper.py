@@ -1,8 +1,13 @@
 import time
 import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import wait
+from functools import lru_cache
+from io import BytesIO, TextIOWrapper
 from pathlib import Path
-from typing import Union
-from xml.dom import minidom
+from typing import Union, Optional
 
 from requests import RequestException
 
@@ -12,15 +17,119 @@ from app.core.metainfo import MetaInfo
 from app.log import logger
 from app.schemas.types import MediaType
 from app.utils.common import retry
-from app.utils.dom import DomUtils
 from app.utils.http import RequestUtils
 from app.utils.system import SystemUtils
 from PIL import Image
+from .javdownload import downloader
+from .javimagecache import ImageCache
+from .javnfo import NfoWriter, read_element
+
+# 中文字幕角标
+_BADGE_URL = "https://oss-game88.oss-cn-beijing.aliyuncs.com/js_plugs/album/202210/zimu.png"
+_badge_lock = threading.Lock()
+_badge_image: Optional[Image.Image] = None
+
+
+def get_badge() -> Image.Image:
+    """
+    获取中文字幕角标，只从磁盘或网络加载一次
+    """
+    global _badge_image
+    with _badge_lock:
+        if _badge_image is None:
+            badge_path = Path(os.path.join(os.path.abspath(os.path.dirname(__file__)), "zimu.png"))
+            if not badge_path.exists():
+                badge_path.write_bytes(RequestUtils().get_res(url=_BADGE_URL, raise_exception=True).content)
+            with Image.open(str(badge_path)) as badge_img:
+                badge_img.load()
+                _badge_image = badge_img
+        return _badge_image
+
+
+@lru_cache(maxsize=16)
+def get_resized_badge(width: int) -> Image.Image:
+    """
+    获取缩放到指定宽度的中文字幕角标
+    """
+    return get_badge().resize((width, width))
+
+
+def render_poster(content: bytes, badge: bool, file_path: Path) -> bytes:
+    """
+    在内存中裁剪海报并添加角标，返回编码后的图片内容
+    :param content: 原始图片内容
+    :param badge: 是否添加中文字幕角标
+    :param file_path: 海报保存路径，用于确定图片格式
+    """
+    with Image.open(BytesIO(content)) as img:
+        image_format = Image.registered_extensions().get(file_path.suffix.lower()) or img.format
+        w, h = img.size
+        img = img.crop((w - h * 0.7, 0, w, h))
+    if badge:
+        w, h = img.size
+        badge_img = get_resized_badge(int(w * 0.35))
+        img.paste(badge_img, (0, 0), badge_img)
+    output = BytesIO()
+    img.save(output, format=image_format)
+    return output.getvalue()
+
+
+class RemoteStage:
+    """
+    远端刮削文件暂存目录，同一影片的NFO及图片先写入本地临时目录，再通过一次rclone调用上传
+    """
+
+    def __init__(self, remote_dir: Path, transfer_type: str):
+        """
+        :param remote_dir: 远端影片目录
+        :param transfer_type: 传输类型 rclone_copy/rclone_move
+        """
+        self.remote_dir = remote_dir
+        self.transfer_type = transfer_type
+        self.path = settings.TEMP_PATH / "javscraper" / uuid.uuid4().hex
+
+    def write(self, out_file: Path, content: Union[str, bytes]):
+        """
+        写入暂存目录
+        """
+        temp_file = self.path / out_file.relative_to(self.remote_dir)
+        temp_file.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        temp_file.write_bytes(content)
+
+    def upload(self):
+        """
+        上传暂存目录中的所有文件并清理暂存目录
+        """
+        try:
+            if not self.path.exists() or not any(self.path.iterdir()):
+                return
+            if self.transfer_type == 'rclone_move':
+                retcode, retmsg = SystemUtils.rclone_move(self.path, self.remote_dir)
+            else:
+                retcode, retmsg = SystemUtils.rclone_copy(self.path, self.remote_dir)
+            if retcode != 0:
+                logger.error(f"刮削文件上传失败：{self.remote_dir} - {retmsg}")
+            else:
+                logger.info(f"刮削文件已上传：{self.remote_dir}")
+        finally:
+            shutil.rmtree(self.path, ignore_errors=True)
+
 
 class JavScraper:
-    _transfer_type = "link"
-    def __init__(self):
-        pass
+    def __init__(self, cache_path: Path = None):
+        """
+        :param cache_path: 图片缓存目录，为空时不缓存
+        """
+        self._image_cache = ImageCache(path=cache_path) if cache_path else None
+
+    def clear_cache(self):
+        """
+        清空图片缓存
+        """
+        if self._image_cache:
+            self._image_cache.clear()
 
     def scrape_metadata(self, path: Path, mediainfo: MediaInfo, transfer_type: str) -> None:
         """
@@ -54,14 +163,31 @@ class JavScraper:
         :param file_path: 文件路径或者目录路径
         :param transfer_type: 传输类型
         """
-        self._transfer_type = transfer_type
+        # 远端媒体库的刮削文件统一暂存后一次上传
+        stage = RemoteStage(remote_dir=file_path.parent, transfer_type=transfer_type) \
+            if transfer_type in ['rclone_move', 'rclone_copy'] else None
+        try:
+            self.__gen_scraper_files(mediainfo=mediainfo, file_path=file_path,
+                                     transfer_type=transfer_type, stage=stage)
+        finally:
+            if stage:
+                stage.upload()
+
+    def __gen_scraper_files(self, mediainfo: MediaInfo, file_path: Path, transfer_type: str,
+                            stage: Optional[RemoteStage]):
+        """
+        生成刮削文件
+        """
         # 不已存在时才处理
         if not file_path.with_name("movie.nfo").exists() \
                 and not file_path.with_suffix(".nfo").exists():
             #  生成电影描述文件
             self.__gen_movie_nfo_file(mediainfo=mediainfo,
-                                        file_path=file_path)
-        # 生成电影图片
+                                        file_path=file_path,
+                                        transfer_type=transfer_type,
+                                        stage=stage)
+        # 生成电影图片，所有图片并发下载
+        futures = {}
         for attr_name, attr_value in vars(mediainfo).items():
             if attr_value \
                     and attr_name.endswith("_path") \
@@ -70,136 +196,180 @@ class JavScraper:
                     and attr_value.startswith("http"):
                 image_name = attr_name.replace("_path", "") + Path(attr_value).suffix
                 if "sample" not in image_name:
-                    self.__save_image(url=attr_value,
-                                        file_path=file_path.with_name(image_name),
-                                        is_poster=attr_name=='poster_path', badge=mediainfo.cn_subtitle)
+                    image_path = file_path.with_name(image_name)
+                    future = downloader.submit(self.__save_image, url=attr_value,
+                                               file_path=image_path,
+                                               is_poster=attr_name=='poster_path', badge=mediainfo.cn_subtitle,
+                                               transfer_type=transfer_type, stage=stage)
                 else:
                     sample_dir = file_path.parent.joinpath("extrafanart")
-                    if not sample_dir.exists():
-                        sample_dir.mkdir()
+                    if not stage and not sample_dir.exists():
+                        sample_dir.mkdir(exist_ok=True)
                     image_path = sample_dir.joinpath(image_name)
-                    self.__save_image(url=attr_value,
-                                        file_path=image_path,
-                                        is_poster=False, badge=False)
+                    future = downloader.submit(self.__save_image, url=attr_value,
+                                               file_path=image_path,
+                                               is_poster=False, badge=False,
+                                               transfer_type=transfer_type, stage=stage)
+                futures[future] = image_path
+        wait(futures)
+        for future, image_path in futures.items():
+            if future.cancelled():
+                logger.warn(f"{image_path.stem}图片下载已取消")
+            elif future.exception():
+                logger.error(f"{image_path.stem}图片下载失败：{str(future.exception())}")
+
+    def gen_nfo_file(self, mediainfo: MediaInfo, file_path: Path, transfer_type: str,
+                     overwrite: bool = True) -> bool:
+        """
+        生成单个媒体文件的NFO文件
+        :param mediainfo: 识别后的媒体信息
+        :param file_path: 媒体文件路径
+        :param transfer_type: 传输类型
+        :param overwrite: 是否覆盖已存在的NFO
+        :return: 是否已生成
+        """
+        try:
+            return self.__gen_movie_nfo_file(mediainfo=mediainfo,
+                                             file_path=file_path,
+                                             transfer_type=transfer_type,
+                                             overwrite=overwrite)
+        except Exception as err:
+            logger.error(f"{file_path} NFO文件生成失败：{str(err)}")
+            return False
+
     def __gen_movie_nfo_file(self,
                              mediainfo: MediaInfo,
-                             file_path: Path):
+                             file_path: Path,
+                             transfer_type: str,
+                             overwrite: bool = False,
+                             stage: RemoteStage = None) -> bool:
         """
         生成电影的NFO描述文件
         :param mediainfo: 识别后的媒体信息
         :param file_path: 电影文件路径
+        :param transfer_type: 传输类型
+        :param overwrite: 是否覆盖已存在的NFO
+        :param stage: 远端暂存目录
+        :return: 是否已生成
         """
-        # 开始生成XML
         logger.info(f"正在生成Jav NFO文件：{file_path.name}")
-        doc = minidom.Document()
-        root = DomUtils.add_node(doc, doc, "movie")
+        # 已有 movie.nfo 时替换它，不再另外生成同名NFO
+        nfo_path = file_path.with_name("movie.nfo")
+        if not nfo_path.exists():
+            nfo_path = file_path.with_suffix(".nfo")
+        return self.__save_nfo(mediainfo, nfo_path, transfer_type, overwrite, stage)
+
+    @staticmethod
+    def __write_movie_nfo(writer: NfoWriter, mediainfo: MediaInfo, dateadded: str = None):
+        """
+        写入电影NFO
+        :param dateadded: 添加时间，为空时使用当前时间
+        """
+        writer.start("movie")
         # 公共部分
-        doc = self.__gen_common_nfo(mediainfo=mediainfo,
-                                    doc=doc,
-                                    root=root)
+        JavScraper.__write_common_nfo(writer=writer, mediainfo=mediainfo, dateadded=dateadded)
         # 标题
-        DomUtils.add_node(doc, root, "title", mediainfo.title or "")
-        DomUtils.add_node(doc, root, "originaltitle", mediainfo.original_title or "")
+        writer.element("title", mediainfo.title or "")
+        writer.element("originaltitle", mediainfo.original_title or "")
         # 发布日期
-        DomUtils.add_node(doc, root, "premiered", (mediainfo.release_date or "").replace(".", "-"))
-        DomUtils.add_node(doc, root, "releasedate", (mediainfo.release_date or "").replace(".", "-"))
+        writer.element("premiered", (mediainfo.release_date or "").replace(".", "-"))
+        writer.element("releasedate", (mediainfo.release_date or "").replace(".", "-"))
         # 年份
-        DomUtils.add_node(doc, root, "year", (mediainfo.year or "0000")[:4])
-        # 保存
-        self.__save_nfo(doc, file_path.with_suffix(".nfo"))
-
+        writer.element("year", (mediainfo.year or "0000")[:4])
+        writer.end()
 
     @staticmethod
-    def __gen_common_nfo(mediainfo: MediaInfo, doc, root):
+    def __write_common_nfo(writer: NfoWriter, mediainfo: MediaInfo, dateadded: str = None):
         """
-        生成公共NFO
+        写入公共NFO
+        :param dateadded: 添加时间，为空时使用当前时间
         """
         # 添加时间
-        DomUtils.add_node(doc, root, "dateadded",
-                          time.strftime('%Y-%m-%d %H:%M:%S',
-                                        time.localtime(time.time())))
+        writer.element("dateadded",
+                       dateadded or time.strftime('%Y-%m-%d %H:%M:%S',
+                                                  time.localtime(time.time())))
         # javid
-        DomUtils.add_node(doc, root, "javid", mediainfo.douban_id or "")
-        uniqueid_tmdb = DomUtils.add_node(doc, root, "uniqueid", mediainfo.douban_id or "")
-        uniqueid_tmdb.setAttribute("type", "javid")
-        uniqueid_tmdb.setAttribute("default", "true")
+        writer.element("javid", mediainfo.douban_id or "")
+        writer.element("uniqueid", mediainfo.douban_id or "", attrs={"type": "javid", "default": "true"})
 
         # 简介
-        xplot = DomUtils.add_node(doc, root, "plot")
-        xplot.appendChild(doc.createCDATASection(mediainfo.title or ""))
+        writer.cdata("plot", mediainfo.title or "")
 
         # 导演
         for director in mediainfo.directors:
             if director:
-                DomUtils.add_node(doc, root, "director", director.get("directorName") or "")
+                writer.element("director", director.get("directorName") or "")
 
         # 演员
         for actor in mediainfo.actors:
             if actor.get('starName', None) is None: continue
-            # 获取中文名
-            xactor = DomUtils.add_node(doc, root, "actor")
-            DomUtils.add_node(doc, xactor, "name", actor.get("starName") or "")
-            DomUtils.add_node(doc, xactor, "javbus_id", actor.get("starId") or "")
-            DomUtils.add_node(doc, xactor, "thumb",
-                              f"https://www.javbus.com/pics/actress/{actor.get('starId')}_a.jpg")
+            writer.start("actor")
+            writer.element("name", actor.get("starName") or "")
+            writer.element("javbus_id", actor.get("starId") or "")
+            writer.element("thumb", f"https://www.javbus.com/pics/actress/{actor.get('starId')}_a.jpg")
             # https://www.javbus.com/pics/actress/okq_a.jpg
+            writer.end()
 
         # 风格
         genres = mediainfo.genres or []
         for genre in genres:
-            DomUtils.add_node(doc, root, "genre", genre.get("tagName") or "")
+            writer.element("genre", genre.get("tagName") or "")
         if mediainfo.cn_subtitle:
-            DomUtils.add_node(doc, root, "genre", "中文字幕")
+            writer.element("genre", "中文字幕")
         # 评分
-        DomUtils.add_node(doc, root, "rating", mediainfo.vote_average or "0")
+        writer.element("rating", mediainfo.vote_average or "0")
 
-        return doc
-    
-    def __save_nfo(self, doc, file_path: Path):
+    def __save_nfo(self, mediainfo: MediaInfo, file_path: Path, transfer_type: str,
+                   overwrite: bool = False, stage: RemoteStage = None) -> bool:
         """
-        保存NFO
+        保存NFO，本地文件直接流式写入
         """
-        if file_path.exists():
-            return
-        xml_str = doc.toprettyxml(indent="  ", encoding="utf-8")
-        if self._transfer_type in ['rclone_move', 'rclone_copy']:
-            self.__save_remove_file(file_path, xml_str)
+        if file_path.exists() and not overwrite:
+            return False
+        # 覆盖已有NFO时保留原添加时间，避免媒体服务器将其视为新入库
+        dateadded = read_element(file_path, "dateadded") if file_path.exists() else None
+        if transfer_type in ['rclone_move', 'rclone_copy']:
+            buffer = BytesIO()
+            stream = TextIOWrapper(buffer, encoding="utf-8", errors="xmlcharrefreplace", newline="\n")
+            self.__write_movie_nfo(NfoWriter(stream), mediainfo, dateadded)
+            stream.flush()
+            self.__save_remove_file(file_path, buffer.getvalue(), transfer_type, stage)
+            stream.detach()
         else:
-            file_path.write_bytes(xml_str)
+            temp_file = file_path.with_name(f".{file_path.name}.tmp")
+            with open(temp_file, "w", encoding="utf-8", errors="xmlcharrefreplace", newline="\n") as stream:
+                self.__write_movie_nfo(NfoWriter(stream), mediainfo, dateadded)
+            os.replace(temp_file, file_path)
         logger.info(f"NFO文件已保存：{file_path}")
-        
+        return True
+
     @retry(RequestException, logger=logger)
-    def __save_image(self, url: str, file_path: Path, is_poster: bool, badge: bool):
+    def __save_image(self, url: str, file_path: Path, is_poster: bool, badge: bool, transfer_type: str,
+                     stage: RemoteStage = None):
         """
         下载图片并保存
         """
         if file_path.exists():
             return
         try:
-            logger.info(f"正在下载{file_path.stem}图片：{url} ...")
-            r = RequestUtils().get_res(url=url, raise_exception=True)
-            if r:
-                if self._transfer_type in ['rclone_move', 'rclone_copy']:
-                    self.__save_remove_file(file_path, r.content)
+            content = self._image_cache.get(url) if self._image_cache else None
+            if content:
+                logger.info(f"使用缓存的{file_path.stem}图片：{url}")
+            else:
+                logger.info(f"正在下载{file_path.stem}图片：{url} ...")
+                content = downloader.get(url)
+                if content and self._image_cache:
+                    self._image_cache.put(url, content)
+            if content:
+                if transfer_type in ['rclone_move', 'rclone_copy']:
+                    self.__save_remove_file(file_path, content, transfer_type, stage)
                 else:
                     if not is_poster:
-                        file_path.write_bytes(r.content)
+                        file_path.write_bytes(content)
                     else:
-                        file_path.write_bytes(r.content)
-                        img = Image.open(file_path)
-                        w, h = img.size
-                        img = img.crop((w - h * 0.7, 0, w, h))
-                        if badge:
-                            badge_path = Path(os.path.join(os.path.abspath(os.path.dirname(__file__)), "zimu.png"))
-                            if not badge_path.exists():
-                                badge_path.write_bytes(RequestUtils().get_res(url="https://oss-game88.oss-cn-beijing.aliyuncs.com/js_plugs/album/202210/zimu.png", raise_exception=True).content)
-                            badge_img = Image.open(str(badge_path))
-                            w, h = img.size
-                            badge_img = badge_img.resize((int(w*0.35), int(w*0.35)))
-                            img.paste(badge_img, (0,0), badge_img)
-                        img.save(file_path)
+                        # 海报裁剪及添加角标在内存中完成，只写入一次
+                        file_path.write_bytes(render_poster(content, badge=badge, file_path=file_path))
                 logger.info(f"图片已保存：{file_path}")
-                time.sleep(0.5)
             else:
                 logger.info(f"{file_path.stem}图片下载失败，请检查网络连通性")
         except RequestException as err:
@@ -208,16 +378,20 @@ class JavScraper:
             logger.error(f"{file_path.stem}图片下载失败：{str(err)}")
 
             
-    def __save_remove_file(self, out_file: Path, content: Union[str, bytes]):
+    def __save_remove_file(self, out_file: Path, content: Union[str, bytes], transfer_type: str,
+                           stage: RemoteStage = None):
         """
-        保存文件到远端
+        保存文件到远端，有暂存目录时只写入暂存目录，由暂存目录统一上传
         """
+        if stage:
+            stage.write(out_file, content)
+            return
         temp_file = settings.TEMP_PATH / str(out_file)[1:]
         temp_file_dir = temp_file.parent
         if not temp_file_dir.exists():
             temp_file_dir.mkdir(parents=True, exist_ok=True)
         temp_file.write_bytes(content)
-        if self._transfer_type == 'rclone_move':
+        if transfer_type == 'rclone_move':
             SystemUtils.rclone_move(temp_file, out_file)
-        elif self._transfer_type == 'rclone_copy':
+        elif transfer_type == 'rclone_copy':
             SystemUtils.rclone_copy(temp_file, out_file)
\ No newline at end of file
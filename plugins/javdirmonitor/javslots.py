@@ -0,0 +1,85 @@
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Tuple, Union
+
+from app.log import logger
+
+
+class TransferScheduler:
+    """
+    文件转移调度，按转移方式及 (源设备, 目标设备) 分别限制并发
+    链接及同一文件系统内的移动不占用名额，不同磁盘之间的复制可以并行
+    """
+
+    # 不需要排队的转移方式
+    _instant_types = ("link", "softlink")
+
+    def __init__(self, type_limits: Dict[str, int] = None, device_limit: int = 1):
+        """
+        :param type_limits: 各转移方式的并发数
+        :param device_limit: 同一 (源设备, 目标设备) 的并发数
+        """
+        self._type_limits = type_limits or {
+            "copy": 4,
+            "move": 4,
+            "rclone_copy": 1,
+            "rclone_move": 1,
+        }
+        self._device_limit = device_limit
+        self._lock = threading.Lock()
+        self._semaphores: Dict[Tuple, threading.BoundedSemaphore] = {}
+
+    def __semaphore(self, key: Tuple, limit: int) -> threading.BoundedSemaphore:
+        with self._lock:
+            semaphore = self._semaphores.get(key)
+            if not semaphore:
+                semaphore = threading.BoundedSemaphore(max(limit, 1))
+                self._semaphores[key] = semaphore
+            return semaphore
+
+    @staticmethod
+    def __device(path: Path) -> Union[int, str]:
+        """
+        获取路径所在设备，路径不存在时向上查找
+        """
+        for item in (path, *path.parents):
+            try:
+                return os.stat(item).st_dev
+            except OSError:
+                continue
+        return str(path)
+
+    @contextmanager
+    def slot(self, file_item: Path, target_file: Path, transfer_type: str):
+        """
+        获取转移名额，名额不足时等待
+        :param file_item: 文件路径
+        :param target_file: 目标文件路径
+        :param transfer_type: 转移方式
+        """
+        if transfer_type in self._instant_types:
+            yield
+            return
+        src_dev = self.__device(file_item)
+        if transfer_type.startswith("rclone"):
+            dst_dev = "rclone"
+        else:
+            dst_dev = self.__device(target_file.parent)
+            if transfer_type == "move" and src_dev == dst_dev:
+                # 同一文件系统内移动只是重命名
+                yield
+                return
+        type_key = transfer_type if transfer_type in self._type_limits else "copy"
+        device_semaphore = self.__semaphore(("device", src_dev, dst_dev), self._device_limit)
+        type_semaphore = self.__semaphore(("type", type_key), self._type_limits.get(type_key))
+        # 先占用设备名额再占用转移方式名额，避免等待设备时占着转移方式名额
+        if not device_semaphore.acquire(blocking=False):
+            logger.debug(f"等待同一磁盘上的转移任务完成：{file_item}")
+            device_semaphore.acquire()
+        try:
+            with type_semaphore:
+                yield
+        finally:
+            device_semaphore.release()
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from app.log import logger
+
+
+class DirSnapshot:
+    """
+    监控目录快照，按监控目录持久化每个媒体文件的 (大小, 修改时间, inode)，全量同步时只处理新增或变化的文件
+    """
+
+    def __init__(self, path: Path):
+        """
+        :param path: 快照保存目录
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        # 监控目录 -> {文件路径: [大小, 修改时间, inode]}
+        self._snapshots: Dict[str, Dict[str, list]] = {}
+
+    def __file(self, root: str) -> Path:
+        return self._path / f"snapshot_{hashlib.md5(root.encode('utf-8')).hexdigest()}.json"
+
+    def __load(self, root: str) -> Dict[str, list]:
+        """
+        读取监控目录快照，调用方需持有锁
+        """
+        snapshot = self._snapshots.get(root)
+        if snapshot is None:
+            snapshot = {}
+            file = self.__file(root)
+            if file.exists():
+                try:
+                    snapshot = json.loads(file.read_text(encoding="utf-8"))
+                except Exception as e:
+                    logger.warn(f"读取目录快照失败：{root} - {str(e)}")
+            self._snapshots[root] = snapshot
+        return snapshot
+
+    @staticmethod
+    def scan(root: str, extensions: List[str]) -> Dict[str, list]:
+        """
+        扫描监控目录下所有媒体文件
+        """
+        extensions = {ext.lower() for ext in extensions}
+        result = {}
+        stack = [root]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file() \
+                                    and os.path.splitext(entry.name)[1].lower() in extensions:
+                                stat = entry.stat()
+                                result[entry.path] = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+                        except OSError:
+                            continue
+            except OSError as e:
+                logger.debug(f"扫描目录失败：{str(e)}")
+        return result
+
+    def diff(self, root: str, extensions: List[str]) -> Tuple[List[str], Dict[str, list]]:
+        """
+        扫描监控目录并与快照对比
+        :return: 新增或变化的文件列表，当前目录状态
+        """
+        current = self.scan(root, extensions)
+        with self._lock:
+            snapshot = self.__load(root)
+            changed = [path for path, state in current.items() if snapshot.get(path) != state]
+        return changed, current
+
+    def replace(self, root: str, current: Dict[str, list]):
+        """
+        使用扫描结果替换快照并保存
+        """
+        with self._lock:
+            self._snapshots[root] = current
+        self.save(root)
+
+    def save(self, root: str = None):
+        """
+        保存快照
+        :param root: 监控目录，为空时保存全部
+        """
+        with self._lock:
+            roots = [root] if root else list(self._snapshots.keys())
+            for item in roots:
+                snapshot = self._snapshots.get(item)
+                if snapshot is None:
+                    continue
+                try:
+                    self._path.mkdir(parents=True, exist_ok=True)
+                    file = self.__file(item)
+                    temp_file = file.with_suffix(".tmp")
+                    temp_file.write_text(json.dumps(snapshot), encoding="utf-8")
+                    temp_file.replace(file)
+                except Exception as e:
+                    logger.warn(f"保存目录快照失败：{item} - {str(e)}")
+
+    def clear(self):
+        """
+        清空所有快照，下次全量同步时处理所有文件
+        """
+        with self._lock:
+            self._snapshots = {}
+            for file in self._path.glob("snapshot_*.json"):
+                file.unlink(missing_ok=True)
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.utils.http import RequestUtils
+
+
+class AsyncWebClient:
+    """
+    基于asyncio的HTTP客户端
+    所有请求共用一个保持连接的连接池，按站点限制并发，请求在后台事件循环中调度，多个页面的请求可以重叠进行
+    同步调用方通过 get/get_res 使用，事件循环及线程池在首次请求时创建，插件停止时通过 shutdown 释放
+    """
+
+    def __init__(self, pool_size: int = 16, host_limit: int = 4):
+        """
+        :param pool_size: 连接池大小，同时也是最大并发请求数
+        :param host_limit: 同一站点的并发请求数
+        """
+        self._pool_size = pool_size
+        self._host_limit = host_limit
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def __start(self) -> asyncio.AbstractEventLoop:
+        """
+        启动事件循环、线程池及连接池，已启动时直接返回事件循环
+        """
+        with self._lock:
+            if self._loop:
+                return self._loop
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self._pool_size, pool_maxsize=self._pool_size)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+            self._executor = ThreadPoolExecutor(max_workers=self._pool_size, thread_name_prefix="JavWebClient")
+            self._semaphores = {}
+            self._loop = asyncio.new_event_loop()
+            self._loop.set_default_executor(self._executor)
+            threading.Thread(target=self.__run_loop, args=(self._loop,),
+                             name="JavWebClient-loop", daemon=True).start()
+            return self._loop
+
+    @staticmethod
+    def __run_loop(loop: asyncio.AbstractEventLoop):
+        loop.run_forever()
+        loop.close()
+
+    def shutdown(self):
+        """
+        停止事件循环及线程池，未完成的请求被取消，之后再次请求时重新启动
+        """
+        with self._lock:
+            loop, executor, session = self._loop, self._executor, self._session
+            self._loop = self._executor = self._session = None
+        if not loop:
+            return
+
+        async def cancel_all():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            asyncio.run_coroutine_threadsafe(cancel_all(), loop).result(timeout=5)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+        executor.shutdown(wait=False, cancel_futures=True)
+        session.close()
+
+    def __semaphore(self, url: str) -> asyncio.Semaphore:
+        """
+        站点并发信号量，只在事件循环中调用
+        """
+        host = urlparse(url).netloc
+        semaphore = self._semaphores.get(host)
+        if not semaphore:
+            semaphore = asyncio.Semaphore(self._host_limit)
+            self._semaphores[host] = semaphore
+        return semaphore
+
+    def __request(self, session: requests.Session, url: str, text: bool, cookies=None, headers: dict = None,
+                  proxies: dict = None, timeout: int = None):
+        req = RequestUtils(cookies=cookies,
+                           session=session,
+                           headers=dict(headers) if headers else None,
+                           proxies=proxies,
+                           timeout=timeout)
+        return req.get(url=url) if text else req.get_res(url=url)
+
+    async def fetch(self, url: str, text: bool = True, **kwargs):
+        """
+        异步请求
+        :param url: 请求地址
+        :param text: 为True时返回页面文本，否则返回Response
+        :param kwargs: cookies/headers/proxies/timeout
+        """
+        session = self._session
+        async with self.__semaphore(url):
+            return await asyncio.get_running_loop().run_in_executor(
+                None, partial(self.__request, session, url, text, **kwargs))
+
+    def __run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.__start()).result()
+
+    def get(self, url: str, **kwargs) -> Optional[str]:
+        """
+        同步请求页面文本
+        """
+        return self.__run(self.fetch(url, text=True, **kwargs))
+
+    def get_res(self, url: str, **kwargs) -> Optional[requests.Response]:
+        """
+        同步请求，返回Response
+        """
+        return self.__run(self.fetch(url, text=False, **kwargs))
+
+
+# 插件内所有站点共用的HTTP客户端
+web_client = AsyncWebClient()
@@ -0,0 +1,96 @@
+from lxml import etree
+
+
+def compile_parsers(parsers: dict) -> dict:
+    """
+    预编译解析规则中的xpath表达式，结构保持不变
+    """
+    compiled = {}
+    for name, xpaths in parsers.items():
+        if "list" in xpaths:
+            compiled[name] = dict(xpaths)
+            compiled[name]["list"] = etree.XPath(xpaths.get("list"))
+            compiled[name]["item"] = {key: _compile_value(value) for key, value in xpaths.get("item").items()}
+        else:
+            compiled[name] = {key: _compile_value(value) for key, value in xpaths.items()}
+    return compiled
+
+
+def _compile_value(value):
+    if isinstance(value, str):
+        return etree.XPath(value)
+    if isinstance(value, list) and value and isinstance(value[0], str):
+        return [etree.XPath(value[0])] + value[1:]
+    return value
+
+
+def parse_html(html):
+    """
+    解析HTML文档，已解析的文档直接返回
+    """
+    if html is None or isinstance(html, etree._Element):
+        return html
+    if not html:
+        return None
+    return etree.HTML(html)
+
+
+def get_list(xpaths: dict, doc):
+    """
+    按列表规则解析文档
+    :param xpaths: 预编译的解析规则
+    :param doc: 已解析的文档
+    """
+    if not xpaths or doc is None:
+        return None
+    items = xpaths.get("list")(doc)
+    if not items:
+        return None
+    formats = xpaths.get("format") or {}
+    filters = xpaths.get("filter") or {}
+    result = []
+    for item in items:
+        obj = {}
+        for key, value in xpaths.get("item").items():
+            format = formats.get(key) or (lambda x: x)
+            filter = filters.get(key) or (lambda x: True)
+            default = None
+            if isinstance(value, list):
+                default = value[1]
+                value = value[0]
+            if isinstance(value, etree.XPath):
+                text = value(item)
+                if text:
+                    obj[key] = format(text) if len(text) > 1 else format(text[0])
+                else:
+                    obj[key] = default
+            if not filter(obj[key]):
+                obj = None
+                break
+        if obj:
+            result.append(obj)
+    return result
+
+
+def get_obj(xpaths: dict, doc):
+    """
+    按对象规则解析文档
+    :param xpaths: 预编译的解析规则
+    :param doc: 已解析的文档
+    """
+    if not xpaths or doc is None:
+        return None
+    obj = {}
+    for key, value in xpaths.items():
+        try:
+            format = lambda x: x
+            if isinstance(value, list) and len(value) == 2:
+                format = value[1]
+                value = value[0]
+            text = value(doc)
+            text = text[0] if text and len(text) == 1 else text
+            if len(text) == 0: text = None
+            obj[key] = format(text)
+        except Exception as e:
+            pass
+    return obj
@@ -1,8 +1,10 @@
 import datetime
 import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import xml.dom.minidom
 from threading import Event
-from typing import Tuple, List, Dict, Any
+from typing import Tuple, List, Dict, Any, Set
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -29,6 +31,10 @@ from .javmenu import JavMenuWeb
 from .javlib import JavlibWeb
 from .jav115 import Jav115
 from .javbus import JavbusWeb
+from .javcode import is_jav
+from .historystore import HistoryStore
+from .webpager import crawl_pages
+from .webclient import web_client
 
 class JavSubscribe(_PluginBase):
     # 插件名称
@@ -71,12 +77,23 @@ class JavSubscribe(_PluginBase):
     _aria2_secret = "3515"
     _searching = False
     _115_max_downloading_num = 5
+    # 并发获取订阅地址的线程数，同一站点的并发由 web_client 限制
+    _fetch_workers = 8
+    # 每个订阅地址最多抓取的页数
+    _page_depth = 1
+    # 媒体库番号索引：番号 -> 媒体库条目ID
+    _library_index: Dict[str, int] = None
+    # 已处理记录，明细只保留最近的部分，番号单独索引用于去重
+    _history: HistoryStore = None
+    _LIBRARY_CODE_RE = re.compile(r"[A-Z0-9]+[-_][A-Z0-9]+(?:[-_]\d+)?")
 
     def init_plugin(self, config: dict = None):
         self.media_server_db = get_db().__next__()
         self.jav115 = None
         self.downloadchain = DownloadChain()
         self.javlibWeb = JavlibWeb()
+        self._history = HistoryStore(self, "history")
+        self._history.migrate("history")
         self.aria2 = aria2p.API(
             aria2p.Client(
                 host=self._aria2_host,
@@ -100,6 +117,7 @@ class JavSubscribe(_PluginBase):
                 self._custom_addrs = []
             self._ranks = config.get("ranks") or []
             self._clear = config.get("clear")
+            self._page_depth = int(config.get("page_depth")) if config.get("page_depth") else 1
 
         # 停止现有任务
         self.stop_service()
@@ -169,30 +187,42 @@ class JavSubscribe(_PluginBase):
         # 读取历史记录
         if self._clearflag:
             wait_download_queue = []
-            history = []
+            self._history.clear()
         else:
             wait_download_queue: List[dict] = self.get_data('wait_download_queue') or []
-            history: List[dict] = self.get_data('history') or []
+        # 本次新处理的记录
+        history: List[dict] = []
         
+        # 重建媒体库番号索引
+        self.__build_library_index()
+
         # 清理已存在的数据
         exits_jav_list = [item['id'] for item in wait_download_queue if self.jav_exists_by_javid(item['id'])]
         logger.info(f"清理媒体库中已存在数据：" + ",".join(exits_jav_list))
         wait_download_queue = [item for item in wait_download_queue if item['id'] not in exits_jav_list]
 
-        for addr in addr_list:
-            if not addr:
-                continue
-            try:
-                logger.info(f"获取订阅地址：{addr} ...")
-                addrs_info = self.__get_addrs_info(addr, history, wait_download_queue)
-                if not addrs_info or len(addrs_info) == 0:
-                    logger.info(f"订阅地址：{addr} ，未查询到数据")
-                    continue
-                
-                logger.info(f"订阅地址：{addr} ，共 {len(addrs_info)} 条数据")
-                wait_download_queue.extend(addrs_info)
-            except Exception as e:
-                logger.error(str(e))
+        # 已处理及待处理的番号索引，所有订阅地址共用
+        history_ids = self._history.ids()
+        queue_ids = {item.get("id") for item in wait_download_queue}
+        addr_list = [addr for addr in addr_list if addr]
+        # 翻页时整页都已处理过则停止
+        known_ids = history_ids | queue_ids
+        is_known = lambda info: (javid := self.is_jav(info.get('id'))) and \
+            (javid in known_ids or self.jav_exists_by_javid(javid) is not None)
+        # 并发获取所有订阅地址，按订阅地址顺序合并
+        with ThreadPoolExecutor(max_workers=self._fetch_workers, thread_name_prefix="JavSubscribe") as executor:
+            pages = executor.map(partial(self.__fetch_addr, is_known=is_known), addr_list)
+            for addr, info_list in zip(addr_list, pages):
+                try:
+                    addrs_info = self.__get_addrs_info(addr, info_list, history_ids, queue_ids)
+                    if not addrs_info or len(addrs_info) == 0:
+                        logger.info(f"订阅地址：{addr} ，未查询到数据")
+                        continue
+
+                    logger.info(f"订阅地址：{addr} ，共 {len(addrs_info)} 条数据")
+                    wait_download_queue.extend(addrs_info)
+                except Exception as e:
+                    logger.error(str(e))
 
         # 去重
         unique_dict = {item['id']: item for item in wait_download_queue}
@@ -246,38 +276,55 @@ class JavSubscribe(_PluginBase):
 
         # 保存历史记录
         self.save_data('wait_download_queue', wait_download_queue)
-        self.save_data('history', history)
+        self._history.append(history)
         # 缓存只清理一次
         self._clearflag = False
         logger.info(f"所有订阅地址刷新完成")
         self._searching = False
     
-    def __get_addrs_info(self, addr, history, wait_download_queue) -> List[dict]:
-        if not addr: return []
+    def __fetch_addr(self, addr, is_known=None) -> List[dict]:
+        """
+        获取订阅地址的页面数据，出错时返回空列表
+        :param is_known: 判断数据是否已处理过，翻页时整页都已处理过则停止
+        """
         logger.info(f"获取页面数据：{addr} ...")
         info_list = []
-        if "javmenu.com" in addr:
-            info_list = JavMenuWeb().page_jav_list(addr)['jav_list']
-        elif "javbus" in addr:
-            info_list = JavbusWeb().page_jav_list(addr)['jav_list']
-            for item in info_list:
-                if "img" in item:
-                    item['img'] = item['img'].replace("/pics/thumb/", "/pics/cover/").replace(".jpg", "_b.jpg")
+        try:
+            if "javmenu.com" in addr:
+                info_list = crawl_pages(partial(JavMenuWeb().page_jav_list, addr), self._page_depth, is_known)
+            elif "javbus" in addr:
+                info_list = crawl_pages(partial(JavbusWeb().page_jav_list, addr), self._page_depth, is_known)
+                for item in info_list:
+                    if "img" in item:
+                        item['img'] = item['img'].replace("/pics/thumb/", "/pics/cover/").replace(".jpg", "_b.jpg")
+        except Exception as e:
+            logger.error(f"获取订阅地址 {addr} 失败：{str(e)}")
+        return info_list or []
 
+    def __get_addrs_info(self, addr, info_list: List[dict],
+                         history_ids: Set[str], queue_ids: Set[str]) -> List[dict]:
+        """
+        过滤订阅地址中已处理过的数据
+        :param info_list: 订阅地址的页面数据
+        :param history_ids: 已处理的番号
+        :param queue_ids: 待处理的番号，新增的数据会加入其中
+        """
         addrs_infos = []
         # 过滤已处理过的
         for info in info_list:
-            if info and not self.is_jav(info['id']):
+            if not info:
                 continue
-            info['id'] = self.is_jav(info['id'])
-            if info and info['id'] in [h.get("id") for h in wait_download_queue]:
+            javid = self.is_jav(info['id'])
+            if not javid:
                 continue
-            if info and info['id'] in [h.get("id") for h in history]:
+            info['id'] = javid
+            if javid in queue_ids or javid in history_ids:
                 continue
-            itemid = self.jav_exists_by_javid(info.get('id'))
+            itemid = self.jav_exists_by_javid(javid)
             if itemid is not None:
-                logger.info(info['id'] + ' 媒体库中已存在')
+                logger.info(javid + ' 媒体库中已存在')
                 continue
+            queue_ids.add(javid)
             addrs_infos.append(info)
         logger.info(f"页面地址：{addr} ，共 {len(addrs_infos)} 条数据")
         return addrs_infos
@@ -294,6 +341,8 @@ class JavSubscribe(_PluginBase):
                     self._scheduler.shutdown()
                     self._event.clear()
                 self._scheduler = None
+            # 释放网络请求的线程池
+            web_client.shutdown()
         except Exception as e:
             print(str(e))
 
@@ -320,6 +369,7 @@ class JavSubscribe(_PluginBase):
             "custom_addrs": '\n'.join(map(str, self._custom_addrs)),
             "clear": self._clear,
             "auto_download": self._auto_download,
+            "page_depth": self._page_depth,
         })
 
     
@@ -328,7 +378,7 @@ class JavSubscribe(_PluginBase):
         拼装插件详情页面，需要返回页面配置，同时附带数据
         """
         # 查询历史记录
-        historys = self.get_data('history')
+        historys = self._history.page(0)
         wait_download_queue = self.get_data('wait_download_queue')
         if not historys and not wait_download_queue:
             return [
@@ -610,6 +660,23 @@ class JavSubscribe(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'page_depth',
+                                            'label': '翻页深度',
+                                            'placeholder': '每个订阅地址最多抓取的页数，整页已处理过时提前停止'
+                                        }
+                                    }
+                                ]
                             }
                         ]
                     }
@@ -622,60 +689,38 @@ class JavSubscribe(_PluginBase):
             "vote": "",
             "ranks": [],
             "custom_addrs": "",
-            "clear": False
+            "clear": False,
+            "page_depth": 1
         }
     
+    def __build_library_index(self):
+        """
+        从媒体库构建番号索引，标题中所有番号形式的片段都会被索引
+        """
+        index = {}
+        for item_id, title in self.media_server_db.query(MediaServerItem.id, MediaServerItem.title).all():
+            if not title:
+                continue
+            title = title.upper()
+            codes = set(self._LIBRARY_CODE_RE.findall(title))
+            code = is_jav(title)
+            if code:
+                codes.add(code)
+            for code in codes:
+                index.setdefault(code.replace("_", "-"), item_id)
+        self._library_index = index
+        logger.info(f"媒体库番号索引已建立，共 {len(index)} 个番号")
+
     def jav_exists_by_javid(self, javid: str):
-        return self.media_server_db.query(MediaServerItem).filter(MediaServerItem.title.like(f"%{javid}%")).first()
+        """
+        查询番号是否在媒体库中存在
+        :return: 媒体库条目ID，不存在时返回None
+        """
+        if not javid:
+            return None
+        if self._library_index is None:
+            self.__build_library_index()
+        return self._library_index.get(javid.upper().replace("_", "-"))
     
     def is_jav(self, title):
-        if not title:
-            return None
-        if title.endswith('/'):
-            title = title[:-1]
-        else:
-            title = title[title.rfind('/')+1:]
-        title = title.upper().replace("SIS001", "").replace("1080P", "").replace("720P", "").replace("2160P", "")
-        t = re.search(r'T28[\-_]\d{3,4}', title)
-        # 一本道
-        if not t:
-            t = re.search(r'1PONDO[\-_]\d{6}[\-_]\d{2,4}', title)
-            if t:
-                t = t.group().replace("1PONDO_", "").replace("1PONDO-", "")
-        if not t:
-            t = re.search(r'HEYZO[\-_]?\d{4}', title)
-        if not t:
-            # 加勒比
-            t = re.search(r'CARIB[\-_]\d{6}[\-_]\d{3}' ,title)
-            if t:
-                t = t.group().replace("CARIB-", "").replace("CARIB_", "")
-        if not t:
-            # 东京热
-            t = re.search(r'N[-_]\d{4}' ,title)
-        
-        if not t:
-            # Jukujo-Club | 熟女俱乐部
-            t = re.search(r'JUKUJO[-_]\d{4}' ,title)
-
-        # 通用
-        # if not t:
-        #     t = re.search(r'S[A-Z]{1,4}[-_]\d{3,5}' ,title)
-        if not t:
-            t = re.search(r'[A-Z]{2,5}[-_]\d{3,5}' ,title)
-        if not t:
-            t = re.search(r'\d{6}[\-_]\d{2,4}' ,title)
-
-        # if not t:
-        #     t = re.search(r'[A-Z]+\d{3,5}' ,title)
-        
-        # if not t:
-        #     t = re.search(r'[A-Za-z]+[-_]?\d+' ,title)
-        
-        # if not t:
-        #     t = re.search(r'\d+[-_]?\d+' ,title)
-            
-        if not t:
-            return None
-        else:
-            t = t.group().replace("_", "-")
-            return t
\ No newline at end of file
+        return is_jav(title)
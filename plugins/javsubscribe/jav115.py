@@ -10,7 +10,7 @@ from app.log import logger
 from app.core.config import settings
 from app.helper.cookiecloud import CookieCloudHelper
 
-from .javmenu import is_jav
+from .javcode import is_jav
 from .javbus import JavbusWeb
 from .web115 import Py115Web
 
@@ -1,13 +1,11 @@
 from app.utils.singleton import Singleton
 from app.core.config import settings
-from app.utils.http import RequestUtils
-from lxml import etree
+from .webparser import compile_parsers, parse_html, get_list, get_obj
+from .webclient import web_client
 import re
-import requests
+from urllib.parse import urlparse
 
 class JavbusWeb(object):
-    _session = requests.Session()
-
     global _web_base
     _web_base = "https://www.javbus.com"
     _page_limit = 50
@@ -28,7 +26,7 @@ class JavbusWeb(object):
         "actor_medias": f"{_web_base}/star/%s/%s"
     }
 
-    _webparsers = {
+    _webparsers = compile_parsers({
         "search_pagination": {
             "list": '//ul[@class="pagination pagination-lg"]',
             "item": {
@@ -138,7 +136,7 @@ class JavbusWeb(object):
                 "img": lambda x : None if not x else _web_base + x
             }
         }
-    }
+    })
     
     @classmethod
     def __invoke_web(cls, url, params=(), cookies='', headers={}):
@@ -151,11 +149,11 @@ class JavbusWeb(object):
         if "user-agent" not in headers:
             headers['accept-language'] = 'zh-CN,zh;q=0.9,en;q=0.8,en-US;q=0.7'
             headers['user-agent'] = 'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/102.0.0.0 Safari/537.36'
-        return RequestUtils(cookies=cookies,
-                            session=cls._session,
-                            headers=headers,
-                            proxies=cls._proxies,
-                            timeout=cls._timout).get(url=req_url % params)
+        return web_client.get(req_url % params,
+                              cookies=cookies,
+                              headers=headers,
+                              proxies=cls._proxies,
+                              timeout=cls._timout)
 
     @classmethod
     def __invoke_json(cls, url, *kwargs):
@@ -165,10 +163,10 @@ class JavbusWeb(object):
         headers = {}
         headers['accept-language'] = 'zh-CN,zh;q=0.9,en;q=0.8,en-US;q=0.7'
         headers['user-agent'] = 'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/102.0.0.0 Safari/537.36'
-        req = RequestUtils(session=cls._session,
-                            headers=headers,
-                            proxies=cls._proxies,
-                           timeout=cls._timout).get_res(url=req_url % kwargs)
+        req = web_client.get_res(req_url % kwargs,
+                                 headers=headers,
+                                 proxies=cls._proxies,
+                                 timeout=cls._timout)
         return req.json() if req else None
 
     @staticmethod
@@ -179,64 +177,22 @@ class JavbusWeb(object):
 
     @classmethod
     def __get_list(cls, url, html):
-        if not url or not html:
-            return None
-        xpaths = cls._webparsers.get(url)
-        if not xpaths:
+        if not url:
             return None
-        items = etree.HTML(html).xpath(xpaths.get("list"))
-        if not items:
-            return None
-        result = []
-        for item in items:
-            obj = {}
-            for key, value in xpaths.get("item").items():
-                format = lambda x:x
-                if xpaths.get("format") and xpaths.get("format").get(key):
-                    format = xpaths.get("format").get(key)
-                default = None
-                if isinstance(value, list):
-                    default = value[1]
-                    value = value[0]
-                if isinstance(value, str):
-                    text = item.xpath(value)
-                    if text:
-                        obj[key] = format(text) if len(text) > 1 else format(text[0])
-                    else:
-                        obj[key] = default
-            if obj:
-                result.append(obj)
-        return result
+        return get_list(cls._webparsers.get(url), parse_html(html))
 
     @classmethod
     def __get_obj(cls, url, html):
-        if not url or not html:
-            return None
-        xpaths = cls._webparsers.get(url)
-        if not xpaths:
+        if not url:
             return None
-        obj = {}
-        for key, value in xpaths.items():
-            try:
-                format = lambda x:x
-                if isinstance(value, list) and len(value) == 2:
-                    format = value[1]
-                    value = value[0]
-                text = etree.HTML(html).xpath(value)
-                text = text[0] if text and len(text) == 1 else text
-                if len(text) == 0: text = None
-                obj[key] = format(text)
-            except Exception as e:
-                pass
-                # ExceptionUtils.exception_traceback(e)
-        return obj
+        return get_obj(cls._webparsers.get(url), parse_html(html))
 
     @classmethod
     def search(cls, keyword, page=1, magnet='all', type='normal'):
         """
         关键字查询
         """
-        doc = cls.__invoke_web("search", cookies="existmag={}".format('mag' if magnet=='all' else 'all'), params=('search' if type=='normal' else 'uncensored', keyword, page))
+        doc = parse_html(cls.__invoke_web("search", cookies="existmag={}".format('mag' if magnet=='all' else 'all'), params=('search' if type=='normal' else 'uncensored', keyword, page)))
         movies = cls.__get_list("search_movies", doc)
         pagination = cls.__get_list('search_pagination', doc)
         return {'movies': movies if movies else [], 'pagination': pagination, "keyword": keyword}
@@ -245,11 +201,13 @@ class JavbusWeb(object):
         return self.detail(code)
     
     @classmethod
-    def detail(cls, id):
+    def detail(cls, id, magnets=True):
         """
         影片详情
+        :param magnets: 是否查询磁力链接，为False时不请求磁力接口，magnets为空列表
         """
-        doc = cls.__invoke_web("detail", params=(id))
+        html = cls.__invoke_web("detail", params=(id))
+        doc = parse_html(html)
         info = cls.__get_obj("detail_info", doc)
         info['score'] = 0.0
         info['director'] = cls.__get_obj("directorInfo", doc)
@@ -260,12 +218,16 @@ class JavbusWeb(object):
         info['stars'] = cls.__get_list("stars", doc)
         info['samples'] = cls.__get_list("samples", doc)
         info['related'] = cls.__get_list("related", doc)
+        if not magnets:
+            info['magnets'] = []
+            info['magnet'] = None
+            return info
         gidReg = "var gid = (\d+);"
         ucReg = "var uc = (\d+);"
-        gid = re.search(gidReg, doc)
+        gid = re.search(gidReg, html)
         gid = gid.group(1) if gid else None
         
-        uc = re.search(ucReg, doc)
+        uc = re.search(ucReg, html)
         uc = uc.group(1) if uc else None
         
         magnets_html = cls.__invoke_web("magnets", headers={'referer': _web_base+'/'+id}, params=(gid,uc))
@@ -299,13 +261,34 @@ class JavbusWeb(object):
         """
         演员参与作品
         """
-        doc = cls.__invoke_web("actor_medias", cookies="existmag={}".format('mag' if magnet=='all' else 'all'), params=(aid, page))
+        doc = parse_html(cls.__invoke_web("actor_medias", cookies="existmag={}".format('mag' if magnet=='all' else 'all'), params=(aid, page)))
         movies = cls.__get_list("search_movies", doc)
         pagination = cls.__get_list('search_pagination', doc)
         return {'movies': movies if movies else [], 'pagination': pagination, "actor_id": aid}
     
+    @staticmethod
+    def page_url(url, page=1):
+        """
+        列表页面第page页的地址，页码在路径末尾，首页及无码首页为 /page/页码
+        """
+        if page <= 1:
+            return url
+        parts = urlparse(url)
+        # 搜索页面的参数跟在路径末尾，如 /search/关键字&type=1
+        path, sep, params = parts.path.rstrip("/").partition("&")
+        segments = path.split("/")
+        # 去掉开头及无码前缀后，形如 page/页码 或 类型/ID/页码
+        core = segments[2:] if segments[1:2] == ["uncensored"] else segments[1:]
+        if core[-1:] and core[-1].isdigit() and (len(core) >= 3 or core[-2:-1] == ["page"]):
+            segments[-1] = str(page)
+        elif path in ("", "/uncensored"):
+            segments += ["page", str(page)]
+        else:
+            segments.append(str(page))
+        return parts._replace(path="/".join(segments) + sep + params).geturl()
+
     @classmethod
-    def page_jav_list(cls, url):
+    def page_jav_list(cls, url, page=1):
         """
         列表页面
         """
@@ -313,7 +296,8 @@ class JavbusWeb(object):
         if "#all" in url:
             url = url.replace("#all", "")
             magnet = False
-        doc = cls.__invoke_web(url, headers={"cookie": "existmag={}".format("mag" if magnet else "all")})
+        url = cls.page_url(url, page)
+        doc = parse_html(cls.__invoke_web(url, headers={"cookie": "existmag={}".format("mag" if magnet else "all")}))
         movies = cls.__get_list("search_movies", doc)
         pagination = cls.__get_list('search_pagination', doc)
         return {'jav_list': movies if movies else [], 'pagination': pagination, "url": url}
@@ -336,4 +320,4 @@ class JavbusWeb(object):
             return round(num * 1024)
         elif 'B' in size:
             return round(num)
-        return 0
\ No newline at end of file
+        return 0
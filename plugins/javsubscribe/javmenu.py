@@ -1,13 +1,12 @@
 from app.utils.singleton import Singleton
 from app.core.config import settings
-from app.utils.http import RequestUtils
-from lxml import etree
+from .webparser import compile_parsers, parse_html, get_list, get_obj
+from .webclient import web_client
+from .javcode import is_jav
 import re
-import requests
+from urllib.parse import urlparse
 
 class JavMenuWeb(object):
-    _session = requests.Session()
-
     global _web_base
     _web_base = "https://javmenu.com"
     _page_limit = 50
@@ -23,7 +22,7 @@ class JavMenuWeb(object):
         "rank_list": f"{_web_base}/zh/rank/%s/%s?page=%s"
     }
 
-    _webparsers = {
+    _webparsers = compile_parsers({
         "jav_list": {
             "list": '//div[contains(@class,"category-page")]/div',
             "item": {
@@ -45,7 +44,7 @@ class JavMenuWeb(object):
             "nextPage": ["//li[@class='page-item active']/following-sibling::li[1]/*/text()", lambda x : int(x) if x else -1],
             "totalPage": ["//li[@class='page-item'][last()-1]/*/text()", lambda x: int(x)]
         },
-    }
+    })
     
     @classmethod
     def __invoke_web(cls, url, params=(), cookies='', headers={}):
@@ -58,11 +57,11 @@ class JavMenuWeb(object):
         if "user-agent" not in headers:
             headers['accept-language'] = 'zh-CN,zh;q=0.9,en;q=0.8,en-US;q=0.7'
             headers['user-agent'] = 'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/102.0.0.0 Safari/537.36'
-        return RequestUtils(cookies=cookies,
-                            session=cls._session,
-                            headers=headers,
-                            proxies=cls._proxies,
-                            timeout=cls._timout).get(url=req_url % params)
+        return web_client.get(req_url % params,
+                              cookies=cookies,
+                              headers=headers,
+                              proxies=cls._proxies,
+                              timeout=cls._timout)
 
     @classmethod
     def __invoke_json(cls, url, *kwargs):
@@ -72,10 +71,10 @@ class JavMenuWeb(object):
         headers = {}
         headers['accept-language'] = 'zh-CN,zh;q=0.9,en;q=0.8,en-US;q=0.7'
         headers['user-agent'] = 'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/102.0.0.0 Safari/537.36'
-        req = RequestUtils(session=cls._session,
-                            headers=headers,
-                            proxies=cls._proxies,
-                           timeout=cls._timout).get_res(url=req_url % kwargs)
+        req = web_client.get_res(req_url % kwargs,
+                                 headers=headers,
+                                 proxies=cls._proxies,
+                                 timeout=cls._timout)
         return req.json() if req else None
 
     @staticmethod
@@ -86,81 +85,45 @@ class JavMenuWeb(object):
 
     @classmethod
     def __get_list(cls, url, html):
-        if not url or not html:
-            return None
-        xpaths = cls._webparsers.get(url)
-        if not xpaths:
+        if not url:
             return None
-        items = etree.HTML(html).xpath(xpaths.get("list"))
-        if not items:
-            return None
-        result = []
-        for item in items:
-            obj = {}
-            for key, value in xpaths.get("item").items():
-                format = lambda x:x
-                filter = lambda x:True
-                if xpaths.get("format") and xpaths.get("format").get(key):
-                    format = xpaths.get("format").get(key)
-                if xpaths.get("filter") and xpaths.get("filter").get(key):
-                    filter = xpaths.get("filter").get(key)
-
-                default = None
-                if isinstance(value, list):
-                    default = value[1]
-                    value = value[0]
-                if isinstance(value, str):
-                    text = item.xpath(value)
-                    if text:
-                        obj[key] = format(text) if len(text) > 1 else format(text[0])
-                    else:
-                        obj[key] = default
-                if not filter(obj[key]):
-                    obj = None
-                    break
-            if obj:
-                result.append(obj)
-        return result
+        return get_list(cls._webparsers.get(url), parse_html(html))
 
     @classmethod
     def __get_obj(cls, url, html):
-        if not url or not html:
+        if not url:
             return None
-        xpaths = cls._webparsers.get(url)
-        if not xpaths:
-            return None
-        obj = {}
-        for key, value in xpaths.items():
-            try:
-                format = lambda x:x
-                if isinstance(value, list) and len(value) == 2:
-                    format = value[1]
-                    value = value[0]
-                text = etree.HTML(html).xpath(value)
-                text = text[0] if text and len(text) == 1 else text
-                if len(text) == 0: text = None
-                obj[key] = format(text)
-            except Exception as e:
-                pass
-                # ExceptionUtils.exception_traceback(e)
-        return obj
+        return get_obj(cls._webparsers.get(url), parse_html(html))
 
     @classmethod
     def rank_list(cls, type="censored", rank_type="day", page=1):
         """
         排行榜
         """
-        doc = cls.__invoke_web("rank_list", params=(type, rank_type, str(page)))
+        doc = parse_html(cls.__invoke_web("rank_list", params=(type, rank_type, str(page))))
         jav_list = cls.__get_list("jav_list", doc)
         pagination = cls.__get_obj('search_pagination', doc)
         return {'jav_list': jav_list if jav_list else [], 'pagination': pagination}
     
+    @staticmethod
+    def page_url(url, page=1):
+        """
+        列表页面第page页的地址，通过page参数翻页
+        """
+        if page <= 1:
+            return url
+        parts = urlparse(url)
+        # 保留原始的查询参数，避免重新编码
+        query = [param for param in parts.query.split("&") if param and not param.startswith("page=")]
+        query.append(f"page={page}")
+        return parts._replace(query="&".join(query)).geturl()
+
     @classmethod
-    def page_jav_list(cls, page_url):
+    def page_jav_list(cls, page_url, page=1):
         """
         获取列表
         """
-        doc = cls.__invoke_web(page_url)
+        doc = parse_html(cls.__invoke_web(cls.page_url(page_url, page)))
         jav_list = cls.__get_list("jav_list", doc)
         pagination = cls.__get_obj('search_pagination', doc)
         return {'jav_list': jav_list if jav_list else [], 'pagination': pagination}
@@ -184,56 +147,3 @@ class JavMenuWeb(object):
         elif 'B' in size:
             return round(num)
         return 0
-    
-    
-def is_jav(title):
-    if not title:
-        return None
-    if title.endswith('/'):
-        title = title[:-1]
-    else:
-        title = title[title.rfind('/')+1:]
-    title = title.upper().replace("SIS001", "").replace("1080P", "").replace("720P", "").replace("2160P", "")
-    t = re.search(r'T28[\-_]\d{3,4}', title)
-    # 一本道
-    if not t:
-        t = re.search(r'1PONDO[\-_]\d{6}[\-_]\d{2,4}', title)
-        if t:
-            t = t.group().replace("1PONDO_", "").replace("1PONDO-", "")
-    if not t:
-        t = re.search(r'HEYZO[\-_]?\d{4}', title)
-    if not t:
-        # 加勒比
-        t = re.search(r'CARIB[\-_]\d{6}[\-_]\d{3}' ,title)
-        if t:
-            t = t.group().replace("CARIB-", "").replace("CARIB_", "")
-    if not t:
-        # 东京热
-        t = re.search(r'N[-_]\d{4}' ,title)
-    
-    if not t:
-        # Jukujo-Club | 熟女俱乐部
-        t = re.search(r'JUKUJO[-_]\d{4}' ,title)
-
-    # 通用
-    # if not t:
-    #     t = re.search(r'S[A-Z]{1,4}[-_]\d{3,5}' ,title)
-    if not t:
-        t = re.search(r'[A-Z]{2,5}[-_]\d{3,5}' ,title)
-    if not t:
-        t = re.search(r'\d{6}[\-_]\d{2,4}' ,title)
-
-    # if not t:
-    #     t = re.search(r'[A-Z]+\d{3,5}' ,title)
-    
-    # if not t:
-    #     t = re.search(r'[A-Za-z]+[-_]?\d+' ,title)
-    
-    # if not t:
-    #     t = re.search(r'\d+[-_]?\d+' ,title)
-        
-    if not t:
-        return None
-    else:
-        t = t.group().replace("_", "-")
-        return t
\ No newline at end of file
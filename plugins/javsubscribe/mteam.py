@@ -1,7 +1,8 @@
 from app.utils.singleton import Singleton
 from app.core.config import settings
 from app.utils.http import RequestUtils
-from lxml import etree
+from .webparser import compile_parsers, parse_html, get_list, get_obj
+from .javcode import is_jav
 import re
 import requests
 from app.db.models.site import Site
@@ -22,7 +23,7 @@ class MTeam(object):
     _weburls = {
     }
 
-    _webparsers = {
+    _webparsers = compile_parsers({
         "search_list": {
             "list": '//table[@class="torrents"]/tr[1]/following-sibling::tr',
             "item": {
@@ -37,7 +38,7 @@ class MTeam(object):
                 "size": lambda x: "".join(x)
             }
         },
-    }
+    })
 
     _site = None
     mteam_url = "https://xp.m-team.io/"
@@ -67,64 +68,15 @@ class MTeam(object):
 
     @classmethod
     def __get_list(cls, url, html):
-        if not url or not html:
-            return None
-        xpaths = cls._webparsers.get(url)
-        if not xpaths:
+        if not url:
             return None
-        items = etree.HTML(html).xpath(xpaths.get("list"))
-        if not items:
-            return None
-        result = []
-        for item in items:
-            obj = {}
-            for key, value in xpaths.get("item").items():
-                format = lambda x:x
-                filter = lambda x:True
-                if xpaths.get("format") and xpaths.get("format").get(key):
-                    format = xpaths.get("format").get(key)
-                if xpaths.get("filter") and xpaths.get("filter").get(key):
-                    filter = xpaths.get("filter").get(key)
-
-                default = None
-                if isinstance(value, list):
-                    default = value[1]
-                    value = value[0]
-                if isinstance(value, str):
-                    text = item.xpath(value)
-                    if text:
-                        obj[key] = format(text) if len(text) > 1 else format(text[0])
-                    else:
-                        obj[key] = default
-                if not filter(obj[key]):
-                    obj = None
-                    break
-            if obj:
-                result.append(obj)
-        return result
+        return get_list(cls._webparsers.get(url), parse_html(html))
 
     @classmethod
     def __get_obj(cls, url, html):
-        if not url or not html:
+        if not url:
             return None
-        xpaths = cls._webparsers.get(url)
-        if not xpaths:
-            return None
-        obj = {}
-        for key, value in xpaths.items():
-            try:
-                format = lambda x:x
-                if isinstance(value, list) and len(value) == 2:
-                    format = value[1]
-                    value = value[0]
-                text = etree.HTML(html).xpath(value)
-                text = text[0] if text and len(text) == 1 else text
-                if len(text) == 0: text = None
-                obj[key] = format(text)
-            except Exception as e:
-                pass
-                # ExceptionUtils.exception_traceback(e)
-        return obj
+        return get_obj(cls._webparsers.get(url), parse_html(html))
 
     @classmethod
     def search_jav_list(cls, javlist):
@@ -132,7 +84,7 @@ class MTeam(object):
         # https://xp.m-team.io/adult.php?incldead=1&spstate=0&inclbookmarked=0&search=ssis-809+ssis-666&search_area=0&search_mode=1
         query = "+".join([item.lower() for item in javlist])
         url = f"{cls.mteam_url}/adult.php?incldead=1&spstate=0&inclbookmarked=0&search=${query}&search_area=0&search_mode=1"
-        doc = cls.__invoke_web(url, cookies=cls.cookie)
+        doc = parse_html(cls.__invoke_web(url, cookies=cls.cookie))
         print(doc)
         search_list = cls.__get_list("search_list", doc)
         return search_list
@@ -157,56 +109,3 @@ def __bytes(size):
     elif 'B' in size:
         return round(num)
     return 0
-    
-    
-def is_jav(title):
-    if not title:
-        return None
-    if title.endswith('/'):
-        title = title[:-1]
-    else:
-        title = title[title.rfind('/')+1:]
-    title = title.upper().replace("SIS001", "").replace("1080P", "").replace("720P", "").replace("2160P", "")
-    t = re.search(r'T28[\-_]\d{3,4}', title)
-    # 一本道
-    if not t:
-        t = re.search(r'1PONDO[\-_]\d{6}[\-_]\d{2,4}', title)
-        if t:
-            t = t.group().replace("1PONDO_", "").replace("1PONDO-", "")
-    if not t:
-        t = re.search(r'HEYZO[\-_]?\d{4}', title)
-    if not t:
-        # 加勒比
-        t = re.search(r'CARIB[\-_]\d{6}[\-_]\d{3}' ,title)
-        if t:
-            t = t.group().replace("CARIB-", "").replace("CARIB_", "")
-    if not t:
-        # 东京热
-        t = re.search(r'N[-_]\d{4}' ,title)
-    
-    if not t:
-        # Jukujo-Club | 熟女俱乐部
-        t = re.search(r'JUKUJO[-_]\d{4}' ,title)
-
-    # 通用
-    # if not t:
-    #     t = re.search(r'S[A-Z]{1,4}[-_]\d{3,5}' ,title)
-    if not t:
-        t = re.search(r'[A-Z]{2,5}[-_]\d{3,5}' ,title)
-    if not t:
-        t = re.search(r'\d{6}[\-_]\d{2,4}' ,title)
-
-    # if not t:
-    #     t = re.search(r'[A-Z]+\d{3,5}' ,title)
-    
-    # if not t:
-    #     t = re.search(r'[A-Za-z]+[-_]?\d+' ,title)
-    
-    # if not t:
-    #     t = re.search(r'\d+[-_]?\d+' ,title)
-        
-    if not t:
-        return None
-    else:
-        t = t.group().replace("_", "-")
-        return t
\ No newline at end of file
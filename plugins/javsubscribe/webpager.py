@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from app.log import logger
+
+
+def has_next_page(pagination) -> bool:
+    """
+    根据分页信息判断是否还有下一页，兼容列表和对象两种解析结果
+    """
+    if isinstance(pagination, list):
+        pagination = pagination[0] if pagination else None
+    if not pagination:
+        return False
+    if "hasNextPage" in pagination:
+        return bool(pagination.get("hasNextPage"))
+    return (pagination.get("nextPage") or -1) > 0
+
+
+def crawl_pages(fetch: Callable[[int], dict], depth: int,
+                is_known: Optional[Callable[[dict], bool]] = None, batch: int = 4) -> List[dict]:
+    """
+    分页抓取列表，第一页单独获取，之后每批并发获取多页，按页码顺序合并
+    遇到没有下一页、空页或整页数据都已处理过时停止，已处理过的列表通常只需请求第一页
+    之后的页获取失败时停止翻页，返回已合并的数据
+    :param fetch: 按页码获取列表，返回 {'jav_list': [...], 'pagination': ...}
+    :param depth: 最多抓取的页数
+    :param is_known: 判断数据是否已处理过，为空时不提前停止
+    :param batch: 每批并发获取的页数
+    """
+    jav_list = []
+    depth = max(depth, 1)
+    with ThreadPoolExecutor(max_workers=min(batch, depth), thread_name_prefix="JavPager") as executor:
+        page = 1
+        while page <= depth:
+            pages = range(page, min(page + (batch if page > 1 else 1), depth + 1))
+            futures = [executor.submit(fetch, page_no) for page_no in pages]
+            for page_no, future in zip(pages, futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # 第一页失败视为无数据，之后的页失败时保留已获取的数据
+                    logger.error(f"获取第 {page_no} 页失败：{str(e)}")
+                    return jav_list
+                items = (result or {}).get("jav_list") or []
+                jav_list.extend(items)
+                if not items or not has_next_page((result or {}).get("pagination")):
+                    return jav_list
+                if is_known and all(is_known(item) for item in items):
+                    logger.info(f"第 {page_no} 页数据均已处理过，停止翻页")
+                    return jav_list
+            page = pages[-1] + 1
+    return jav_list